@@ -0,0 +1,201 @@
+# Mide el reporte completo (descarga, tablas, resumen y Excel) contra el servidor de prueba
+# mock_canvas.py, sin tocar el Canvas real. Por cada escenario guarda en results.jsonl el tiempo
+# total, el tiempo por etapa, el pico de memoria y las consultas hechas, para comparar entre cambios.
+#
+#   python benchmarks/bench_report.py --students 50 2000 20000 --tasks 20 --courses 3
+#   python benchmarks/bench_report.py --students 5000 --tasks 0 --latency 0.1 --error-rate 0.02
+#   python benchmarks/bench_report.py --students 2000 --latency 0.3 --backends rest graphql
+#
+# El servidor corre en otro proceso para que no compita por el GIL con la app.
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import mock_canvas
+import synthetic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.jsonl")
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Levanta el servidor de prueba en un proceso aparte y devuelve (proceso, url base)
+def start_mock(courses, args):
+    context = multiprocessing.get_context("spawn")
+    url_queue = context.Queue()
+    process = context.Process(
+        target=mock_canvas.serve, args=(courses, url_queue), daemon=True,
+        kwargs={
+            'latency': args.latency, 'latency_per_item': args.latency_per_item, 'error_rate': args.error_rate,
+            'rate_limit': args.rate_limit, 'rate_limit_refill': args.rate_limit_refill, 'seed': args.seed
+        }
+    )
+    process.start()
+    return process, url_queue.get(timeout=60)
+
+# Un reporte completo, con las mismas etapas que cli.run_diplomado.
+# Devuelve (segundos, métricas, resultados por curso)
+def run_report(course_ids, include_assignments, output_path):
+    import metrics
+    from report import fetch_courses, collect_results, build_report, export_report
+
+    run_metrics = metrics.RunMetrics()
+    start = time.perf_counter()
+    with metrics.use(run_metrics):
+        with metrics.stage("Descarga y proceso de cursos"):
+            results, errors, diplomado_name = collect_results(fetch_courses(course_ids, include_assignments))
+        if errors:
+            raise RuntimeError("; ".join(errors))
+        with metrics.stage("Vistas y resumen"):
+            _, course_sheets, summary = build_report(results, include_assignments)
+        with metrics.stage("Excel"):
+            export_report(output_path, course_sheets, summary, diplomado_name)
+    return time.perf_counter() - start, run_metrics.to_dict(), results
+
+# Repite el reporte y devuelve (tiempos, mejor tiempo, métricas de la mejor, pico de memoria, resultados)
+def measure(course_ids, args):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, "reporte.xlsx")
+        runs = [run_report(course_ids, args.tasks > 0, output_path) for _ in range(args.repeat)]
+        seconds, data, results = min(runs, key=lambda run: run[0])
+        peak_memory = None
+        # tracemalloc hace más lento el código, por eso la memoria se mide en una corrida aparte
+        if not args.no_memory:
+            tracemalloc.start()
+            run_report(course_ids, args.tasks > 0, output_path)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return [run[0] for run in runs], seconds, data, peak_memory, results
+
+def assert_same_results(expected, actual, description):
+    import pandas as pd
+
+    assert list(expected) == list(actual), f"{description}: cursos distintos"
+    for course_id in expected:
+        pd.testing.assert_frame_equal(expected[course_id]['df'], actual[course_id]['df'], obj=f"{description}, curso {course_id}")
+        assert expected[course_id]['task_columns'] == actual[course_id]['task_columns'], f"{description}, curso {course_id}: tareas distintas"
+
+def summarize(seconds, data, peak_memory):
+    stages = {}
+    for entry in data['stages']:
+        # Las etapas por curso se suman entre cursos
+        stages[entry['stage']] = stages.get(entry['stage'], 0.0) + entry['seconds']
+    endpoints = data['endpoints'].values()
+    return {
+        'seconds': seconds,
+        'stages': stages,
+        'peak_memory_mb': peak_memory / 2 ** 20 if peak_memory is not None else None,
+        'requests': data['requests'],
+        'pages': sum(e['pages'] for e in endpoints),
+        'retries': sum(e['retries'] for e in endpoints),
+        'errors': sum(e['errors'] for e in endpoints),
+        'bytes': sum(e['bytes'] for e in endpoints),
+        'request_cost': data['rate_limit']['cost'],
+        'endpoints': data['endpoints'],
+    }
+
+# El último resultado guardado para el mismo escenario, si lo hay
+def previous_result(path, scenario):
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                if entry['scenario'] == scenario:
+                    previous = entry
+    return previous
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del reporte completo contra un Canvas de prueba.")
+    parser.add_argument("--students", type=int, nargs="+", default=[50, 2000, 20000], help="estudiantes por curso, un escenario por valor")
+    parser.add_argument("--tasks", type=int, default=20, help="tareas por curso (0 = reporte sin tareas)")
+    parser.add_argument("--courses", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3, help="repeticiones por escenario, se guarda la más rápida")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--latency-per-item", type=float, default=0.0002)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=700.0)
+    parser.add_argument("--rate-limit-refill", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backends", nargs="+", choices=["rest", "graphql"], default=["rest"],
+                        help="backends a medir; con más de uno se verifica además que den las mismas tablas")
+    parser.add_argument("--no-memory", action="store_true", help="omitir la corrida extra con tracemalloc")
+    parser.add_argument("--label", default="", help="nombre libre para identificar la corrida en los resultados")
+    parser.add_argument("--results", default=RESULTS_PATH)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Sin caché, para medir siempre la descarga completa
+    os.environ["CACHE_ENABLED"] = "False"
+    os.environ.setdefault("TOKEN", "benchmark")
+    commit = git_commit()
+
+    print(f"{'estudiantes':>11} {'tareas':>6} {'backend':>8} {'segundos':>9} {'memoria MB':>10} {'consultas':>9} {'reintentos':>10}   vs. anterior")
+    for students in args.students:
+        courses = synthetic.make_diplomado(args.courses, students, args.tasks, seed=args.seed)
+        course_ids = [str(course['id']) for course in courses]
+        process, base_url = start_mock(courses, args)
+        measurements = []
+        try:
+            # canvas_http.py lee CANVAS_URL al importarse, así que la app se importa recién aquí
+            os.environ["CANVAS_URL"] = base_url
+            sys.path.insert(0, ROOT)
+            import canvas
+            import canvas_http
+            canvas_http.BASE_URL = base_url
+            for backend in args.backends:
+                canvas.CANVAS_BACKEND = backend
+                # El saldo de cuota visto en la corrida anterior no aplica a esta
+                canvas_http._rate_limit.update(remaining=None, cost=None)
+                measurements.append((backend, *measure(course_ids, args)))
+        finally:
+            process.terminate()
+            process.join()
+
+        # Con varios backends, los datos descargados deben dar exactamente las mismas tablas
+        reference_backend, *_, reference_results = measurements[0]
+        for backend, *_, results in measurements[1:]:
+            assert_same_results(reference_results, results, f"{reference_backend} vs. {backend}")
+
+        for backend, runs, seconds, data, peak_memory, _ in measurements:
+            scenario = {
+                'courses': args.courses, 'students': students, 'tasks': args.tasks, 'backend': backend,
+                'latency': args.latency, 'latency_per_item': args.latency_per_item, 'error_rate': args.error_rate,
+                'rate_limit': args.rate_limit, 'rate_limit_refill': args.rate_limit_refill, 'seed': args.seed
+            }
+            entry = {
+                'date': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                'commit': commit,
+                'label': args.label,
+                'scenario': scenario,
+                'runs': runs,
+                **summarize(seconds, data, peak_memory),
+            }
+            previous = previous_result(args.results, scenario)
+            with open(args.results, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+            memory = f"{entry['peak_memory_mb']:.1f}" if peak_memory is not None else "-"
+            comparison = f"{previous['seconds'] / seconds:.2f}x ({previous['commit']})" if previous else "-"
+            print(f"{students:>11} {args.tasks:>6} {backend:>8} {seconds:>9.2f} {memory:>10} {entry['requests']:>9} {entry['retries']:>10}   {comparison}")
+            for stage, stage_seconds in entry['stages'].items():
+                print(f"{'':>13}{stage}: {stage_seconds:.3f}s")
+
+if __name__ == "__main__":
+    main()
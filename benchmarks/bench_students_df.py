@@ -0,0 +1,101 @@
+# Compara la construcción de la tabla de estudiantes fila a fila (versión anterior) con la
+# versión por columnas de report.build_students_df, sobre cursos sintéticos.
+#
+#   python benchmarks/bench_students_df.py [--sizes 5000 20000 50000] [--tasks 20]
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+
+os.environ.setdefault("TOKEN", "benchmark")
+os.environ.setdefault("CACHE_ENABLED", "False")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import report  # noqa: E402
+from synthetic import fake_enrollments  # noqa: E402
+
+def fake_delivered(enrollments, num_tasks, seed=0):
+    rng = random.Random(seed)
+    user_ids = [e["user"]["id"] for e in enrollments]
+    return [{uid for uid in user_ids if rng.random() < 0.6} for _ in range(num_tasks)]
+
+# Versión anterior, fila a fila, tal como estaba en main() de main.py
+def legacy_students_df(students, delivered_sets):
+    data = []
+    for student in students:
+        participation = '✔️' if student.get("last_activity_at") else '❌'
+        created_str = student.get("created_at")
+        created = datetime.strptime(created_str, "%Y-%m-%dT%H:%M:%SZ") if created_str else None
+        activity_str = student.get("last_activity_at")
+        activity = datetime.strptime(activity_str, "%Y-%m-%dT%H:%M:%SZ") if activity_str else None
+        total_activity = student.get("total_activity_time")
+        horas = total_activity // 3600
+        minutos = (total_activity % 3600) // 60
+        segundos = total_activity % 60
+        total_activity_formated = f"{horas:02}:{minutos:02}:{segundos:02}"
+
+        sortable_name_list = student.get('user', {}).get('sortable_name', '').split(',')
+        if len(sortable_name_list) < 2:
+            sortable_name_list = [sortable_name_list[0] if sortable_name_list else "", ""]
+
+        rut = student.get('user', {}).get("sis_user_id")
+        user_id = student.get('user', {}).get('id')
+        data.append({
+            "Nombres": sortable_name_list[1].strip() if len(sortable_name_list)>1 else "",
+            "Apellidos": sortable_name_list[0].strip() if len(sortable_name_list)>0 else "",
+            "RUT": f"{rut[:-1]}-{rut[-1]}" if rut and len(rut) > 1 else None,
+            "Correo": student.get('user', {}).get("login_id"),
+            "Matriculado": created.strftime("%d-%m-%Y %H:%M") if created else None,
+            "Ultima actividad": activity.strftime("%d-%m-%Y %H:%M") if activity else "Nunca",
+            "Ha participado": participation,
+            "Actividad total": total_activity_formated,
+            "user_id": user_id
+        })
+    df = pd.DataFrame(data)
+    for i, delivered in enumerate(delivered_sets):
+        df[f"Tarea {i + 1}"] = df['user_id'].apply(lambda uid: "✔️" if uid in delivered else "❌")
+    return df
+
+# Tabla tipada (tareas booleanas) más el formateo para mostrarla, para comparar lo mismo que ve el usuario
+def columnar_students_df(students, delivered_sets):
+    df = report.build_students_df(students)
+    task_columns = [f"Tarea {i + 1}" for i in range(len(delivered_sets))]
+    for task_name, delivered in zip(task_columns, delivered_sets):
+        df[task_name] = df['user_id'].isin(delivered)
+    return report.format_students_df(df, task_columns)
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5000, 20000, 50000])
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'inscripciones':>13} {'fila a fila':>12} {'columnar':>10} {'aceleración':>12}")
+    for size in args.sizes:
+        students = fake_enrollments(size)
+        delivered_sets = fake_delivered(students, args.tasks)
+        legacy_time, legacy_df = best_of(lambda: legacy_students_df(students, delivered_sets), args.repeat)
+        columnar_time, columnar_df = best_of(lambda: columnar_students_df(students, delivered_sets), args.repeat)
+        # Las dos versiones deben producir exactamente la misma tabla visible
+        pd.testing.assert_frame_equal(
+            legacy_df.drop(columns="user_id").fillna(""),
+            columnar_df.drop(columns="user_id").fillna(""),
+            check_dtype=False
+        )
+        print(f"{size:>13} {legacy_time:>11.3f}s {columnar_time:>9.3f}s {legacy_time / columnar_time:>11.1f}x")
+
+if __name__ == "__main__":
+    main_bench()
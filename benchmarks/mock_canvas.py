@@ -0,0 +1,282 @@
+# Servidor local que imita los endpoints REST de Canvas que usa la app, y /api/graphql, sobre
+# cursos sintéticos (todos en la subcuenta 1).
+# Pagina con header Link, agrega latencia, informa X-Rate-Limit-Remaining / X-Request-Cost
+# (y responde 403 "Rate Limit Exceeded" si se agota la cuota) y puede fallar con 5xx al azar.
+#
+#   python benchmarks/mock_canvas.py --courses 3 --students 2000 --tasks 20 --latency 0.05
+#
+# y luego, en otra terminal, CANVAS_URL=<url que imprime> TOKEN=x streamlit run main.py
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import mock_graphql
+import synthetic
+
+MAX_PER_PAGE = 100
+ACCOUNT_NAME = "Diplomado Sintético"
+REQUEST_COST = 0.2
+ITEM_COST = 0.002
+
+class MockCanvas(ThreadingHTTPServer):
+    daemon_threads = True
+
+    # latency: segundos fijos por consulta; latency_per_item: segundos extra por elemento devuelto.
+    # rate_limit: saldo inicial de la cuota (0 = sin cuota), que se recupera a rate_limit_refill por segundo
+    def __init__(self, courses, host="127.0.0.1", port=0, latency=0.0, latency_per_item=0.0,
+                 error_rate=0.0, rate_limit=700.0, rate_limit_refill=10.0, seed=0):
+        super().__init__((host, port), MockCanvasHandler)
+        self.courses = {course['id']: course for course in courses}
+        self.accounts = {course['account_id'] for course in courses}
+        self.latency = latency
+        self.latency_per_item = latency_per_item
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rate_limit_refill = rate_limit_refill
+        self.remaining = rate_limit
+        self.refilled_at = time.monotonic()
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'throttled': 0, 'items': 0}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def should_fail(self):
+        with self.lock:
+            return self.error_rate > 0 and self.random.random() < self.error_rate
+
+    # Cuota tipo "leaky bucket" como la de Canvas: cada consulta descuenta su costo
+    def charge(self, cost):
+        with self.lock:
+            if not self.rate_limit:
+                return None
+            now = time.monotonic()
+            self.remaining = min(self.rate_limit, self.remaining + (now - self.refilled_at) * self.rate_limit_refill)
+            self.refilled_at = now
+            if self.remaining < cost:
+                return False
+            self.remaining -= cost
+            return self.remaining
+
+class MockCanvasHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    # Cuenta la consulta y responde 401 o un 5xx al azar; devuelve False si ya se respondió
+    def accept_request(self):
+        server = self.server
+        server.count('requests')
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            self.send_json(401, {"errors": [{"message": "Invalid access token."}]})
+            return False
+        if server.should_fail():
+            server.count('errors')
+            self.send_json(server.random.choice([500, 502, 503]), {"errors": [{"message": "Internal server error"}]})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self.accept_request():
+            return
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = re.sub(r'^/api/v1', '', url.path)
+        try:
+            status, body, total = self.route(path, query)
+        except KeyError:
+            return self.send_json(404, {"errors": [{"message": "The specified resource does not exist."}]})
+
+        links = None
+        if total is not None:
+            per_page = min(int(query.get('per_page', ['10'])[0]), MAX_PER_PAGE)
+            page = max(1, int(query.get('page', ['1'])[0]))
+            start = (page - 1) * per_page
+            body = body(start, min(start + per_page, total))
+            links = self.page_links(url.path, query, page, per_page, total)
+
+        items = len(body) if isinstance(body, list) else 1
+        self.send_charged(status, body, items, {"Link": links} if links else None)
+
+    # /api/graphql, con las consultas que hace canvas_graphql.py (ver mock_graphql.py)
+    def do_POST(self):
+        # El cuerpo se lee siempre, para no desordenar la conexión keep-alive
+        payload = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.accept_request():
+            return
+        if urlparse(self.path).path != "/api/graphql":
+            return self.send_json(404, {"errors": [{"message": "The specified resource does not exist."}]})
+        try:
+            request = json.loads(payload)
+        except ValueError:
+            return self.send_json(400, {"errors": [{"message": "Invalid JSON body."}]})
+        body, items = mock_graphql.execute(
+            self.server.courses, request.get('operationName'), request.get('variables') or {}, request.get('query')
+        )
+        self.send_charged(200, body, items)
+
+    # Descuenta la cuota, espera la latencia configurada y responde con los headers de Canvas
+    def send_charged(self, status, body, items, headers=None):
+        server = self.server
+        # Canvas cobra según el tiempo de servidor; aquí, una base más un tanto por elemento
+        cost = REQUEST_COST + ITEM_COST * items
+        remaining = server.charge(cost)
+        if remaining is False:
+            server.count('throttled')
+            return self.send_text(403, "403 Forbidden (Rate Limit Exceeded)", {"X-Rate-Limit-Remaining": "0.0"})
+
+        delay = server.latency + server.latency_per_item * items
+        if delay:
+            time.sleep(delay)
+        server.count('items', items)
+        headers = dict(headers or {}, **{"X-Request-Cost": f"{cost:.4f}"})
+        if remaining is not None:
+            headers["X-Rate-Limit-Remaining"] = f"{remaining:.4f}"
+        self.send_json(status, body, headers)
+
+    # Devuelve (status, cuerpo, total). Si total no es None el cuerpo es una función (inicio, fin)
+    # que arma solo la página pedida
+    def route(self, path, query):
+        courses = self.server.courses
+        match = re.fullmatch(r'/accounts/(\d+)(/courses)?', path)
+        if match:
+            account_id = int(match.group(1))
+            if account_id not in self.server.accounts:
+                raise KeyError(account_id)
+            if match.group(2):
+                account_courses = [self.course_json(c) for c in courses.values() if c['account_id'] == account_id]
+                return 200, lambda start, end: account_courses[start:end], len(account_courses)
+            return 200, {"id": account_id, "name": ACCOUNT_NAME, "parent_account_id": None}, None
+
+        match = re.fullmatch(r'/courses/(\d+)(/.*)?', path)
+        if not match:
+            raise KeyError(path)
+        course = courses[int(match.group(1))]
+        rest = match.group(2) or ''
+        students = course['students']
+        assignments = course['assignments']
+
+        if rest == '':
+            return 200, self.course_json(course), None
+        if rest == '/enrollments':
+            return 200, lambda start, end: [synthetic.enrollment(course, i) for i in range(start, end)], students
+        if rest == '/assignments':
+            return 200, lambda start, end: [synthetic.assignment(course, j) for j in range(start, end)], assignments
+
+        if rest == '/students/submissions':
+            since = self.since_filter(query)
+            if since is None:
+                # Entregas ordenadas por estudiante y luego por tarea
+                return 200, lambda start, end: [
+                    synthetic.submission(course, k % assignments, k // assignments) for k in range(start, end)
+                ], students * assignments
+            changed = [
+                s for s in (synthetic.submission(course, k % assignments, k // assignments) for k in range(students * assignments))
+                if since(s)
+            ]
+            return 200, lambda start, end: changed[start:end], len(changed)
+        raise KeyError(rest)
+
+    def course_json(self, course):
+        return {
+            "id": course['id'], "name": course['name'], "account_id": course['account_id'],
+            "enrollment_term_id": 1, "workflow_state": "available"
+        }
+
+    # submitted_since / graded_since, como en la API de Canvas
+    def since_filter(self, query):
+        for param, field in (('submitted_since', 'submitted_at'), ('graded_since', 'graded_at')):
+            if param in query:
+                # Las fechas vienen en el mismo formato ISO que las entregas, se comparan como texto
+                limit = query[param][0]
+                return lambda s: s[field] is not None and s[field] >= limit
+        return None
+
+    def page_links(self, path, query, page, per_page, total):
+        params = {key: values[0] for key, values in query.items()}
+        last = max(1, -(-total // per_page))
+        host, port = self.server.server_address[:2]
+
+        def link(page_num, rel):
+            return f'<http://{host}:{port}{path}?{urlencode(dict(params, page=page_num, per_page=per_page))}>; rel="{rel}"'
+        links = [link(page, "current")]
+        if page < last:
+            links.append(link(page + 1, "next"))
+        if page > 1:
+            links.append(link(page - 1, "prev"))
+        links += [link(1, "first"), link(last, "last")]
+        return ",".join(links)
+
+    def send_json(self, status, body, headers=None):
+        self.send_body(status, json.dumps(body).encode(), "application/json; charset=utf-8", headers)
+
+    def send_text(self, status, text, headers=None):
+        self.send_body(status, text.encode(), "text/plain; charset=utf-8", headers)
+
+    def send_body(self, status, data, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+# Levanta el servidor en un thread y lo devuelve; server.shutdown() lo detiene
+def start_server(courses, **options):
+    server = MockCanvas(courses, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# Para correr el servidor en un proceso aparte: avisa su URL por la cola y atiende hasta que lo terminen
+def serve(courses, url_queue, **options):
+    server = MockCanvas(courses, **options)
+    url_queue.put(server.base_url)
+    server.serve_forever()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API REST de Canvas con cursos sintéticos.")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--courses", type=int, default=3, help="cursos del diplomado sintético")
+    parser.add_argument("--students", type=int, default=500, help="estudiantes por curso")
+    parser.add_argument("--tasks", type=int, default=10, help="tareas por curso")
+    parser.add_argument("--first-course-id", type=int, default=101)
+    parser.add_argument("--latency", type=float, default=0.05, help="segundos por consulta")
+    parser.add_argument("--latency-per-item", type=float, default=0.0002, help="segundos extra por elemento devuelto")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de consultas que responden 5xx")
+    parser.add_argument("--rate-limit", type=float, default=700.0, help="saldo inicial de la cuota (0 = sin cuota)")
+    parser.add_argument("--rate-limit-refill", type=float, default=10.0, help="cuota recuperada por segundo")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    courses = synthetic.make_diplomado(args.courses, args.students, args.tasks, args.first_course_id, seed=args.seed)
+    server = MockCanvas(
+        courses, port=args.port, latency=args.latency, latency_per_item=args.latency_per_item,
+        error_rate=args.error_rate, rate_limit=args.rate_limit, rate_limit_refill=args.rate_limit_refill, seed=args.seed
+    )
+    print(f"CANVAS_URL={server.base_url}")
+    print(f"Cursos: {' '.join(str(course['id']) for course in courses)}")
+    print(f"Subcuenta: {courses[0]['account_id']}" if courses else "Sin cursos")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
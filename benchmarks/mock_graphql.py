@@ -0,0 +1,114 @@
+# Respuestas de /api/graphql para el servidor de prueba. No interpreta GraphQL en general: reconoce
+# las consultas de canvas_graphql.py por su operationName y arma la respuesta con los mismos cursos
+# sintéticos que sirven los endpoints REST, en el mismo orden, para poder comparar ambos backends.
+import base64
+import re
+from datetime import datetime, timedelta, timezone
+
+import synthetic
+
+# La GraphQL de Canvas responde fechas en la zona horaria de la cuenta, no en UTC
+CANVAS_TZ = timezone(timedelta(hours=-3))
+
+# "2024-03-01T12:30:00Z" -> "2024-03-01T09:30:00-03:00"
+def graphql_time(value):
+    if value is None:
+        return None
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).astimezone(CANVAS_TZ).isoformat()
+
+def cursor(position):
+    return base64.b64encode(str(position).encode()).decode()
+
+def position(after):
+    return int(base64.b64decode(after)) if after else 0
+
+# Una página de una conexión: fetch(inicio, fin) arma solo los nodos pedidos
+def connection(fetch, total, first, after):
+    start = position(after)
+    end = min(start + first, total)
+    return {"nodes": fetch(start, end), "pageInfo": {"hasNextPage": end < total, "endCursor": cursor(end)}}
+
+def enrollment_node(course, i):
+    enrollment = synthetic.enrollment(course, i)
+    user = enrollment['user']
+    return {
+        "_id": str(enrollment['id']),
+        "createdAt": graphql_time(enrollment['created_at']),
+        "lastActivityAt": graphql_time(enrollment['last_activity_at']),
+        "totalActivityTime": enrollment['total_activity_time'],
+        "user": {"_id": str(user['id']), "sortableName": user['sortable_name'], "sisId": user['sis_user_id'], "loginId": user['login_id']},
+    }
+
+def assignment_node(course, j):
+    assignment = synthetic.assignment(course, j)
+    return {"_id": str(assignment['id']), "name": assignment['name']}
+
+def submission_node(submission):
+    return {
+        "assignmentId": str(submission['assignment_id']),
+        "userId": str(submission['user_id']),
+        "state": submission['workflow_state'],
+        "grade": submission['grade'],
+    }
+
+def enrollments_connection(course, first, after):
+    return connection(lambda start, end: [enrollment_node(course, i) for i in range(start, end)], course['students'], first, after)
+
+# Como Canvas, sin filter: {gradingPeriodId: null} solo se devuelven las tareas del periodo de
+# calificación vigente, que en los cursos sintéticos es la primera mitad de las tareas
+def assignments_connection(course, first, after, all_periods):
+    total = course['assignments'] if all_periods else (course['assignments'] + 1) // 2
+    return connection(lambda start, end: [assignment_node(course, j) for j in range(start, end)], total, first, after)
+
+def asks_all_grading_periods(query):
+    return re.search(r'assignmentsConnection\(filter:\s*\{gradingPeriodId:\s*null\}', query or "") is not None
+
+# Entregas del curso ordenadas por estudiante y luego por tarea, como en REST
+def course_submissions_connection(course, first, after, submitted_since=None, graded_since=None):
+    assignments = course['assignments']
+    total = course['students'] * assignments
+    if not submitted_since and not graded_since:
+        return connection(lambda start, end: [
+            submission_node(synthetic.submission(course, k % assignments, k // assignments)) for k in range(start, end)
+        ], total, first, after)
+    # Las fechas vienen en el mismo formato ISO que las entregas, se comparan como texto
+    changed = [
+        submission_node(s) for s in (synthetic.submission(course, k % assignments, k // assignments) for k in range(total))
+        if (submitted_since and s['submitted_at'] and s['submitted_at'] >= submitted_since)
+        or (graded_since and s['graded_at'] and s['graded_at'] >= graded_since)
+    ]
+    return connection(lambda start, end: changed[start:end], len(changed), first, after)
+
+def count_nodes(value):
+    if isinstance(value, dict):
+        return len(value['nodes']) if 'nodes' in value else sum(count_nodes(v) for v in value.values())
+    return 0
+
+# Devuelve (cuerpo de la respuesta, cantidad de nodos) para la operación pedida
+def execute(courses, operation, variables, query=None):
+    first = variables.get('first', 100)
+    all_periods = asks_all_grading_periods(query)
+    course = courses.get(int(variables.get('courseId', 0)))
+    if operation not in ("CourseEnrollments", "CourseAssignments", "CourseSubmissions", "CourseBundle"):
+        return {"errors": [{"message": f"Operación desconocida para el servidor de prueba: {operation}"}]}, 0
+    if course is None:
+        return {"data": {"course": None}}, 0
+
+    if operation == "CourseEnrollments":
+        result = {"enrollmentsConnection": enrollments_connection(course, first, variables.get('after'))}
+    elif operation == "CourseAssignments":
+        result = {"assignmentsConnection": assignments_connection(course, first, variables.get('after'), all_periods)}
+    elif operation == "CourseSubmissions":
+        result = {"submissionsConnection": course_submissions_connection(
+            course, first, variables.get('after'), variables.get('submittedSince'), variables.get('gradedSince')
+        )}
+    else:
+        result = {"_id": str(course['id']), "name": course['name'], "account": {"_id": str(course['account_id'])}}
+        if variables.get('withEnrollments'):
+            result["enrollmentsConnection"] = enrollments_connection(course, first, variables.get('enrollmentsAfter'))
+        if variables.get('withAssignments'):
+            result["assignmentsConnection"] = assignments_connection(course, first, variables.get('assignmentsAfter'), all_periods)
+        if variables.get('withSubmissions'):
+            result["submissionsConnection"] = course_submissions_connection(course, first, variables.get('submissionsAfter'))
+    data = {"course": result}
+    return {"data": data}, count_nodes(data)
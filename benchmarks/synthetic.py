@@ -0,0 +1,120 @@
+# Generador de cursos sintéticos con la forma de las respuestas de Canvas. Cada inscripción,
+# tarea y entrega se calcula a partir de su índice, así el servidor de prueba puede servir
+# cursos de 50.000 estudiantes y 100 tareas sin tener millones de entregas en memoria.
+import time
+
+NOMBRES = ["Juan", "María José", "Pedro", "Camila", "Ignacio", "Fernanda", "José Tomás", "Valentina"]
+APELLIDOS = ["Pérez Soto", "González", "Muñoz Rojas", "Díaz", "Fuentes Araya", "Núñez", "Contreras"]
+TAREAS = ["Foro", "Tarea", "Control", "Evaluación", "Trabajo final"]
+
+# 1 de marzo de 2024, inicio del semestre de los cursos sintéticos
+BASE_TIMESTAMP = 1709251200
+MASK = 0xFFFFFFFFFFFFFFFF
+
+# Número pseudoaleatorio en [0, 1) a partir de enteros (FNV-1a + mezcla final de splitmix64)
+def unit(*keys):
+    h = 0xCBF29CE484222325
+    for key in keys:
+        h = ((h ^ (key & MASK)) * 0x100000001B3) & MASK
+    h = ((h ^ (h >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    h = ((h ^ (h >> 27)) * 0x94D049BB133111EB) & MASK
+    h ^= h >> 31
+    return (h >> 11) / 2 ** 53
+
+def canvas_time(timestamp):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(timestamp))
+
+# Los cursos de un mismo diplomado comparten estudiantes; user_offset desplaza la lista para
+# que cada curso tenga algunos alumnos que no están en los demás. Los nombres comparten un prefijo
+# largo, como en Canvas, así coinciden en los primeros 31 caracteres (el nombre de hoja del Excel)
+def make_course(course_id, students, assignments, account_id=1, user_offset=0, seed=0):
+    return {
+        'id': course_id,
+        'name': f"Diplomado Sintético en Gestión de Proyectos - Módulo {course_id}",
+        'account_id': account_id,
+        'students': students,
+        'assignments': assignments,
+        'user_offset': user_offset,
+        'seed': seed,
+    }
+
+# Un diplomado de num_courses cursos con ~5% de estudiantes distintos entre cursos consecutivos
+def make_diplomado(num_courses, students, assignments, first_course_id=101, account_id=1, seed=0):
+    step = max(1, students // 20)
+    return [
+        make_course(first_course_id + k, students, assignments, account_id, k * step, seed)
+        for k in range(num_courses)
+    ]
+
+def user_id(course, i):
+    return 50000 + course['user_offset'] + i
+
+def enrollment(course, i):
+    uid = user_id(course, i)
+    seed = course['seed']
+    created = BASE_TIMESTAMP + int(unit(seed, uid, 1) * 90 * 24 * 3600)
+    active = unit(seed, course['id'], uid, 2) < 0.7
+    sortable_name = f"{APELLIDOS[uid % len(APELLIDOS)]}, {NOMBRES[(uid // 7) % len(NOMBRES)]}"
+    # Algunos sin coma, como los usuarios creados a mano en Canvas, y algunos sin RUT
+    if unit(seed, uid, 3) >= 0.97:
+        sortable_name = NOMBRES[uid % len(NOMBRES)]
+    rut = str(5000000 + int(unit(seed, uid, 4) * 20000000)) + "0123456789K"[uid % 11] if unit(seed, uid, 5) < 0.95 else None
+    return {
+        "id": course['id'] * 1000000 + i,
+        "course_id": course['id'],
+        "type": "StudentEnrollment",
+        "enrollment_state": "active",
+        "created_at": canvas_time(created),
+        "last_activity_at": canvas_time(created + int(unit(seed, course['id'], uid, 6) * 500 * 3600)) if active else None,
+        "total_activity_time": int(unit(seed, course['id'], uid, 7) * 400000) if active else 0,
+        "grades": {"current_score": None, "final_score": 0.0},
+        "user": {
+            "id": uid,
+            "sortable_name": sortable_name,
+            "sis_user_id": rut,
+            "login_id": f"alumno{uid}@uautonoma.cl",
+        },
+    }
+
+def assignment_id(course, j):
+    return course['id'] * 1000 + j
+
+# Cada 10 tareas hay una autoevaluación, que el reporte debe omitir
+def assignment(course, j):
+    name = "Autoevaluación" if j % 10 == 9 else f"{TAREAS[j % len(TAREAS)]} {j + 1}"
+    return {
+        "id": assignment_id(course, j),
+        "course_id": course['id'],
+        "name": name,
+        "due_at": canvas_time(BASE_TIMESTAMP + (j + 1) * 7 * 24 * 3600),
+        "points_possible": 7.0,
+    }
+
+def submission(course, j, i):
+    uid = user_id(course, i)
+    seed = course['seed']
+    aid = assignment_id(course, j)
+    r = unit(seed, aid, uid, 8)
+    submitted_at = BASE_TIMESTAMP + j * 7 * 24 * 3600 + int(unit(seed, aid, uid, 9) * 6 * 24 * 3600)
+    if r < 0.45:
+        # Calificada; algunas con nota 0, que no cuentan como entregadas
+        grade = "0" if unit(seed, aid, uid, 10) < 0.05 else f"{1 + unit(seed, aid, uid, 11) * 6:.1f}"
+        state, graded_at = "graded", submitted_at + 3 * 24 * 3600
+    elif r < 0.65:
+        grade, state, graded_at = None, "submitted", None
+    else:
+        grade, state, graded_at, submitted_at = None, "unsubmitted", None, None
+    return {
+        "id": aid * 100000 + i,
+        "assignment_id": aid,
+        "user_id": uid,
+        "workflow_state": state,
+        "grade": grade,
+        "submitted_at": canvas_time(submitted_at) if submitted_at else None,
+        "graded_at": canvas_time(graded_at) if graded_at else None,
+    }
+
+# Inscripciones de un curso de n estudiantes, para medir las etapas que no consultan Canvas
+def fake_enrollments(n, seed=0):
+    course = make_course(1, n, 0, seed=seed)
+    return [enrollment(course, i) for i in range(n)]
@@ -0,0 +1,296 @@
+import requests
+from decouple import config, Choices
+import time
+import json
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlparse
+
+import metrics
+import canvas_graphql
+import canvas_http
+from canvas_http import TOKEN, CanvasError, canvas_get
+
+# "rest" o "graphql": de dónde salen inscripciones, tareas y entregas. Con GraphQL un curso con
+# tareas se descarga completo en una sola consulta paginada (ver canvas_graphql.py)
+CANVAS_BACKEND = config("CANVAS_BACKEND", default="rest", cast=Choices(["rest", "graphql"]))
+
+# Caché local de respuestas de Canvas (SQLite). Los recursos que casi no cambian se sirven
+# desde disco mientras no venza su TTL, y luego se revalidan con ETag (304 = sin cambios).
+# También guarda las fotos de entregas por curso para las actualizaciones incrementales
+CACHE_ENABLED = config("CACHE_ENABLED", default=True, cast=bool)
+CACHE_PATH = config("CACHE_PATH", default=".canvas_cache.sqlite3")
+# TTL en segundos por tipo de recurso
+CACHE_TTL = {
+    'course': config("CACHE_TTL_COURSE", default=24 * 3600, cast=int),
+    'account': config("CACHE_TTL_ACCOUNT", default=7 * 24 * 3600, cast=int),
+    'assignments': config("CACHE_TTL_ASSIGNMENTS", default=3600, cast=int),
+}
+# Pasado este tiempo la foto de entregas se descarta y se vuelve a bajar todo (por ejemplo
+# para recoger entregas eliminadas, que no aparecen en los filtros submitted_since/graded_since)
+SNAPSHOT_MAX_AGE = config("SNAPSHOT_MAX_AGE", default=12 * 3600, cast=int)
+# Margen hacia atrás al pedir cambios, por diferencias de reloj con Canvas
+SNAPSHOT_OVERLAP = 300
+
+class CanvasCache:
+    def __init__(self, path, scope):
+        # El scope separa las entradas por token, para no mezclar permisos de distintos usuarios
+        self.scope = scope
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "scope TEXT, url TEXT, etag TEXT, body TEXT, next_url TEXT, fetched_at REAL, "
+                "PRIMARY KEY (scope, url))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS submission_snapshots ("
+                "scope TEXT, course_id TEXT, delivered TEXT, synced_at REAL, full_synced_at REAL, "
+                "PRIMARY KEY (scope, course_id))"
+            )
+            # Cachés creadas antes de full_synced_at: esas fotos quedan vencidas y se rehacen completas
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(submission_snapshots)")]
+            if 'full_synced_at' not in columns:
+                self.conn.execute("ALTER TABLE submission_snapshots ADD COLUMN full_synced_at REAL")
+
+    def get(self, url):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT etag, body, next_url, fetched_at FROM responses WHERE scope = ? AND url = ?",
+                (self.scope, url)
+            ).fetchone()
+        if row is None:
+            return None
+        etag, body, next_url, fetched_at = row
+        return {'etag': etag, 'data': json.loads(body), 'next_url': next_url, 'fetched_at': fetched_at}
+
+    def put(self, url, etag, body, next_url):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (scope, url, etag, body, next_url, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.scope, url, etag, body, next_url, time.time())
+            )
+
+    def touch(self, url, next_url):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE responses SET fetched_at = ?, next_url = ? WHERE scope = ? AND url = ?",
+                (time.time(), next_url, self.scope, url)
+            )
+
+    # Foto de entregas de un curso: {'delivered': {assignment_id: set(user_id)}, 'synced_at': timestamp,
+    # 'full_synced_at': timestamp}. synced_at es la última sincronización (completa o incremental) y
+    # full_synced_at la última descarga completa, con la que se decide cuándo rehacer la foto
+    def get_snapshot(self, course_id):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT delivered, synced_at, full_synced_at FROM submission_snapshots WHERE scope = ? AND course_id = ?",
+                (self.scope, str(course_id))
+            ).fetchone()
+        if row is None:
+            return None
+        delivered, synced_at, full_synced_at = row
+        return {
+            'delivered': {int(aid): set(uids) for aid, uids in json.loads(delivered).items()},
+            'synced_at': synced_at,
+            'full_synced_at': full_synced_at
+        }
+
+    def put_snapshot(self, course_id, delivered, synced_at, full_synced_at):
+        payload = json.dumps({str(aid): sorted(uids) for aid, uids in delivered.items()})
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO submission_snapshots (scope, course_id, delivered, synced_at, full_synced_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.scope, str(course_id), payload, synced_at, full_synced_at)
+            )
+
+    # Borra toda la caché (todas las entradas, de cualquier token) y devuelve cuántas había
+    def purge(self):
+        with self.lock, self.conn:
+            snapshots = self.conn.execute("DELETE FROM submission_snapshots").rowcount
+            return self.conn.execute("DELETE FROM responses").rowcount + snapshots
+
+CACHE = CanvasCache(CACHE_PATH, hashlib.sha256(TOKEN.encode()).hexdigest()[:16]) if CACHE_ENABLED else None
+
+# Página con tantos elementos como per_page (Canvas usa 10 si no se indica y como máximo 100)
+def is_full_page(url, data):
+    per_page = parse_qs(urlparse(url).query).get('per_page', ['10'])[0]
+    return isinstance(data, list) and len(data) >= min(int(per_page), 100)
+
+# Devuelve (datos, url de la página siguiente). Con ttl se usa la caché local y se revalida con ETag
+def canvas_get_json(url, params, error_message, ttl=None):
+    entry = None
+    headers = None
+    if ttl is not None and CACHE is not None:
+        url = requests.Request('GET', url, params=params).prepare().url
+        params = None
+        entry = CACHE.get(url)
+        if entry and time.time() - entry['fetched_at'] < ttl:
+            metrics.record_cache_hit(url)
+            return entry['data'], entry['next_url']
+        if entry and entry['etag']:
+            headers = {"If-None-Match": entry['etag']}
+
+    response = canvas_get(url, params=params, headers=headers)
+    if response.status_code == 304 and entry:
+        # El ETag cubre solo el cuerpo de la página, no sus links: si el 304 trae Link se usa ese
+        has_links = bool(response.headers.get("Link"))
+        next_url = response.links.get('next', {}).get('url') if has_links else entry['next_url']
+        if has_links or next_url is not None or not is_full_page(url, entry['data']):
+            CACHE.touch(url, next_url)
+            return entry['data'], next_url
+        # Última página llena sin Link en el 304: puede haber una página nueva, se pide completa
+        response = canvas_get(url)
+    if response.status_code != 200:
+        raise CanvasError(error_message(response))
+
+    next_url = response.links.get('next', {}).get('url')
+    if ttl is not None and CACHE is not None:
+        CACHE.put(url, response.headers.get("ETag"), response.text, next_url)
+    return response.json(), next_url
+
+# Recorre todas las páginas (header Link) y junta los resultados
+# on_page(páginas, elementos) se llama después de cada página, para mostrar el avance
+def canvas_get_all(url, params, error_message, ttl=None, on_page=None):
+    items = []
+    pages = 0
+    while url:
+        page_url = url
+        data, url = canvas_get_json(url, params, error_message, ttl=ttl)
+        items.extend(data)
+        pages += 1
+        metrics.record_page(page_url)
+        if on_page:
+            on_page(pages, len(items))
+        # La url "next" ya trae los parámetros
+        params = None
+    return items
+
+def get_students(course_id, on_page=None):
+    if CANVAS_BACKEND == "graphql":
+        return canvas_graphql.get_students(course_id, on_page)
+    url = f"{canvas_http.BASE_URL}/courses/{course_id}/enrollments"
+    params = {"type[]": "StudentEnrollment", "per_page": 100}
+    return canvas_get_all(url, params, lambda r: f"Error {r.status_code}: No se pudo obtener la lista de estudiantes del curso {course_id}.", on_page=on_page)
+
+def get_course_info(course_id):
+    data, _ = canvas_get_json(
+        f"{canvas_http.BASE_URL}/courses/{course_id}", None,
+        lambda r: f"Error {r.status_code}: No se pudo obtener la información del curso {course_id}.",
+        ttl=CACHE_TTL['course']
+    )
+    return data
+
+def get_subaccount_info(sub_account_id):
+    data, _ = canvas_get_json(
+        f"{canvas_http.BASE_URL}/accounts/{sub_account_id}", None,
+        lambda r: f"Error {r.status_code}: No se pudo obtener la información de la subcuenta {sub_account_id}.",
+        ttl=CACHE_TTL['account']
+    )
+    return data
+
+# Cursos de una subcuenta (incluye los de sus subcuentas hijas), ordenados por nombre.
+# term_id filtra por periodo académico y states por estado en Canvas (available, completed, ...)
+def get_account_courses(account_id, term_id=None, states=None):
+    url = f"{canvas_http.BASE_URL}/accounts/{account_id}/courses"
+    params = {"per_page": 100, "sort": "course_name"}
+    if term_id:
+        params["enrollment_term_id"] = term_id
+    if states:
+        params["state[]"] = list(states)
+    return canvas_get_all(url, params, lambda r: f"Error {r.status_code}: No se pudieron obtener los cursos de la subcuenta {account_id}.")
+
+def get_assignments(course_id):
+    if CANVAS_BACKEND == "graphql":
+        return canvas_graphql.get_assignments(course_id)
+    url = f"{canvas_http.BASE_URL}/courses/{course_id}/assignments"
+    return canvas_get_all(url, {"per_page": 100}, lambda r: f"Error {r.status_code} al obtener tareas del curso {course_id}: {r.text}", ttl=CACHE_TTL['assignments'])
+
+# Todas las entregas del curso en un solo recorrido paginado, en vez de una consulta por tarea
+def get_course_submissions(course_id, submitted_since=None, graded_since=None, on_page=None):
+    if CANVAS_BACKEND == "graphql":
+        return canvas_graphql.get_course_submissions(course_id, submitted_since, graded_since, on_page)
+    url = f"{canvas_http.BASE_URL}/courses/{course_id}/students/submissions"
+    params = {"student_ids[]": "all", "per_page": 100}
+    if submitted_since:
+        params["submitted_since"] = submitted_since
+    if graded_since:
+        params["graded_since"] = graded_since
+    return canvas_get_all(url, params, lambda r: f"Error {r.status_code} al obtener entregas del curso {course_id}: {r.text}", on_page=on_page)
+
+# Con GraphQL, el curso y sus inscripciones, tareas y entregas de una sola vez. Con REST cada parte se pide por separado
+def uses_course_bundle():
+    return CANVAS_BACKEND == "graphql"
+
+# {'course', 'students', 'assignments', 'delivered'}, con delivered como en get_delivered_by_assignment.
+# Si hay una foto de entregas vigente la consulta no trae entregas y solo se piden los cambios; si no,
+# las entregas de la consulta quedan guardadas como foto completa para las próximas ejecuciones
+def get_course_bundle(course_id, on_page=None):
+    synced_at = time.time()
+    snapshot = CACHE.get_snapshot(course_id) if CACHE is not None else None
+    incremental = snapshot_is_fresh(snapshot, synced_at)
+    bundle = canvas_graphql.get_course_bundle(course_id, on_page, with_submissions=not incremental)
+    submissions = bundle.pop('submissions')
+    if incremental:
+        bundle['delivered'] = get_delivered_by_assignment(course_id)
+    else:
+        bundle['delivered'] = group_delivered(submissions)
+        if CACHE is not None:
+            CACHE.put_snapshot(course_id, bundle['delivered'], synced_at, synced_at)
+    return bundle
+
+def is_delivered(submission):
+    # Entregada o calificada, y si tiene nota debe ser mayor a 0 (o no numérica)
+    if submission.get('workflow_state') not in ['submitted', 'graded']:
+        return False
+    grd = submission.get('grade')
+    if grd is None:
+        return True
+    try:
+        return float(grd) > 0
+    except (TypeError, ValueError):
+        return True
+
+# Agrupa las entregas por tarea: {assignment_id: set(user_id que entregaron)}
+def group_delivered(submissions):
+    delivered_by_assignment = {}
+    for s in submissions:
+        if is_delivered(s):
+            delivered_by_assignment.setdefault(s['assignment_id'], set()).add(s['user_id'])
+    return delivered_by_assignment
+
+# La foto sirve para pedir solo cambios mientras su última descarga completa no tenga más de
+# SNAPSHOT_MAX_AGE, aunque se haya actualizado incrementalmente hace poco
+def snapshot_is_fresh(snapshot, now):
+    return snapshot is not None and snapshot['full_synced_at'] is not None and now - snapshot['full_synced_at'] <= SNAPSHOT_MAX_AGE
+
+# Entregas por tarea del curso. Si hay una foto vigente solo se piden los cambios desde la
+# última sincronización (submitted_since / graded_since) y se aplican sobre la foto
+def get_delivered_by_assignment(course_id, on_page=None):
+    synced_at = time.time()
+    snapshot = CACHE.get_snapshot(course_id) if CACHE is not None else None
+
+    if not snapshot_is_fresh(snapshot, synced_at):
+        delivered_by_assignment = group_delivered(get_course_submissions(course_id, on_page=on_page))
+        full_synced_at = synced_at
+    else:
+        since = datetime.fromtimestamp(snapshot['synced_at'] - SNAPSHOT_OVERLAP, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        changed = get_course_submissions(course_id, submitted_since=since, on_page=on_page)
+        changed += get_course_submissions(course_id, graded_since=since, on_page=on_page)
+        delivered_by_assignment = snapshot['delivered']
+        full_synced_at = snapshot['full_synced_at']
+        for s in changed:
+            delivered = delivered_by_assignment.setdefault(s['assignment_id'], set())
+            if is_delivered(s):
+                delivered.add(s['user_id'])
+            else:
+                delivered.discard(s['user_id'])
+
+    if CACHE is not None:
+        CACHE.put_snapshot(course_id, delivered_by_assignment, synced_at, full_synced_at)
+    return delivered_by_assignment
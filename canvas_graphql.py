@@ -0,0 +1,243 @@
+import re
+from datetime import datetime, timezone
+
+from decouple import config
+
+import canvas_http
+import metrics
+
+# Backend GraphQL de Canvas (/api/graphql), alternativo a los endpoints REST de canvas.py.
+# Devuelve los mismos diccionarios que REST (mismas claves, ids enteros, fechas UTC con "Z"),
+# así las tablas que se arman después son idénticas con cualquiera de los dos backends.
+
+PAGE_SIZE = config("GRAPHQL_PAGE_SIZE", default=100, cast=int)
+
+# Los mismos filtros que usa REST por defecto: estudiantes con inscripción activa o invitada
+ENROLLMENT_FILTER = "{types: [StudentEnrollment], states: [active, invited]}"
+# Sin filtro, assignmentsConnection solo trae las tareas del periodo de calificación vigente;
+# REST devuelve las de todos los periodos
+ASSIGNMENT_FILTER = "{gradingPeriodId: null}"
+# REST devuelve todas las entregas, también las no enviadas (necesarias para la actualización incremental)
+SUBMISSION_STATES = "[submitted, unsubmitted, pending_review, graded]"
+
+FRAGMENTS = """
+fragment EnrollmentFields on Enrollment {
+  _id
+  createdAt
+  lastActivityAt
+  totalActivityTime
+  user { _id sortableName sisId loginId }
+}
+fragment SubmissionFields on Submission {
+  assignmentId
+  userId
+  state
+  grade
+}
+"""
+
+COURSE_ENROLLMENTS = """
+query CourseEnrollments($courseId: ID!, $first: Int!, $after: String) {
+  course(id: $courseId) {
+    enrollmentsConnection(filter: %s, first: $first, after: $after) {
+      nodes { ...EnrollmentFields }
+      pageInfo { hasNextPage endCursor }
+    }
+  }
+}
+""" % ENROLLMENT_FILTER + FRAGMENTS
+
+COURSE_ASSIGNMENTS = """
+query CourseAssignments($courseId: ID!, $first: Int!, $after: String) {
+  course(id: $courseId) {
+    assignmentsConnection(filter: %s, first: $first, after: $after) {
+      nodes { _id name }
+      pageInfo { hasNextPage endCursor }
+    }
+  }
+}
+""" % ASSIGNMENT_FILTER
+
+COURSE_SUBMISSIONS = """
+query CourseSubmissions($courseId: ID!, $first: Int!, $after: String, $submittedSince: DateTime, $gradedSince: DateTime) {
+  course(id: $courseId) {
+    submissionsConnection(
+      filter: {states: %s, submittedSince: $submittedSince, gradedSince: $gradedSince}, first: $first, after: $after
+    ) {
+      nodes { ...SubmissionFields }
+      pageInfo { hasNextPage endCursor }
+    }
+  }
+}
+""" % SUBMISSION_STATES + FRAGMENTS
+
+# Curso, inscripciones, tareas y entregas en una sola consulta. Cada conexión avanza con su propio
+# cursor y deja de pedirse (@include) cuando ya no tiene más páginas
+COURSE_BUNDLE = """
+query CourseBundle(
+  $courseId: ID!, $first: Int!,
+  $enrollmentsAfter: String, $assignmentsAfter: String, $submissionsAfter: String,
+  $withEnrollments: Boolean!, $withAssignments: Boolean!, $withSubmissions: Boolean!
+) {
+  course(id: $courseId) {
+    _id
+    name
+    account { _id }
+    enrollmentsConnection(filter: %s, first: $first, after: $enrollmentsAfter) @include(if: $withEnrollments) {
+      nodes { ...EnrollmentFields }
+      pageInfo { hasNextPage endCursor }
+    }
+    assignmentsConnection(filter: %s, first: $first, after: $assignmentsAfter) @include(if: $withAssignments) {
+      nodes { _id name }
+      pageInfo { hasNextPage endCursor }
+    }
+    submissionsConnection(filter: {states: %s}, first: $first, after: $submissionsAfter) @include(if: $withSubmissions) {
+      nodes { ...SubmissionFields }
+      pageInfo { hasNextPage endCursor }
+    }
+  }
+}
+""" % (ENROLLMENT_FILTER, ASSIGNMENT_FILTER, SUBMISSION_STATES) + FRAGMENTS
+
+# /api/v1 -> /api/graphql, a partir de la URL de la API REST configurada
+def graphql_url():
+    return re.sub(r'/v1/?$', '/graphql', canvas_http.BASE_URL)
+
+def operation_name(query):
+    return re.search(r'query (\w+)', query).group(1)
+
+# Ejecuta una consulta y devuelve "data". Canvas responde 200 también con errores de GraphQL
+def graphql_query(query, variables, error_message):
+    response = canvas_http.canvas_request(
+        "POST", graphql_url(), json={"query": query, "variables": variables, "operationName": operation_name(query)}
+    )
+    if response.status_code != 200:
+        raise canvas_http.CanvasError(f"Error {response.status_code}: {error_message}")
+    body = response.json()
+    if body.get('errors'):
+        details = "; ".join(e.get('message', '') for e in body['errors'])
+        raise canvas_http.CanvasError(f"{error_message} (GraphQL: {details})")
+    return body['data']
+
+# Devuelve el objeto raíz de la respuesta (course o assignment); None significa que no existe o no hay acceso
+def root_object(data, root, error_message):
+    if data.get(root) is None:
+        raise canvas_http.CanvasError(f"Error 404: {error_message}")
+    return data[root]
+
+# Recorre todas las páginas de una conexión y junta sus nodos
+def graphql_all(query, variables, root, connection, error_message, on_page=None):
+    nodes = []
+    pages = 0
+    after = None
+    while True:
+        data = graphql_query(query, dict(variables, first=PAGE_SIZE, after=after), error_message)
+        page = root_object(data, root, error_message)[connection]
+        nodes.extend(page['nodes'])
+        pages += 1
+        metrics.record_page(graphql_url())
+        if on_page:
+            on_page(pages, len(nodes))
+        if not page['pageInfo']['hasNextPage']:
+            return nodes
+        after = page['pageInfo']['endCursor']
+
+# Fechas de GraphQL ("2024-03-01T09:30:00-03:00") al formato de REST ("2024-03-01T12:30:00Z")
+def rest_time(value):
+    if not value:
+        return None
+    return datetime.fromisoformat(value).astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def rest_id(value):
+    return int(value) if value is not None else None
+
+def rest_enrollment(node):
+    user = node.get('user') or {}
+    return {
+        "id": rest_id(node['_id']),
+        "type": "StudentEnrollment",
+        "created_at": rest_time(node.get('createdAt')),
+        "last_activity_at": rest_time(node.get('lastActivityAt')),
+        "total_activity_time": node.get('totalActivityTime') or 0,
+        "user": {
+            "id": rest_id(user.get('_id')),
+            "sortable_name": user.get('sortableName'),
+            "sis_user_id": user.get('sisId'),
+            "login_id": user.get('loginId'),
+        },
+    }
+
+def rest_assignment(node):
+    return {"id": rest_id(node['_id']), "name": node['name']}
+
+# Solo los campos que usa la app; las fechas de entrega no se piden para no inflar la respuesta
+def rest_submission(node):
+    return {
+        "assignment_id": rest_id(node['assignmentId']),
+        "user_id": rest_id(node['userId']),
+        "workflow_state": node['state'],
+        "grade": node.get('grade'),
+    }
+
+def get_students(course_id, on_page=None):
+    nodes = graphql_all(
+        COURSE_ENROLLMENTS, {"courseId": str(course_id)}, "course", "enrollmentsConnection",
+        f"No se pudo obtener la lista de estudiantes del curso {course_id}.", on_page
+    )
+    return [rest_enrollment(node) for node in nodes]
+
+def get_assignments(course_id):
+    nodes = graphql_all(
+        COURSE_ASSIGNMENTS, {"courseId": str(course_id)}, "course", "assignmentsConnection",
+        f"No se pudieron obtener las tareas del curso {course_id}."
+    )
+    return [rest_assignment(node) for node in nodes]
+
+def get_course_submissions(course_id, submitted_since=None, graded_since=None, on_page=None):
+    nodes = graphql_all(
+        COURSE_SUBMISSIONS,
+        {"courseId": str(course_id), "submittedSince": submitted_since, "gradedSince": graded_since},
+        "course", "submissionsConnection",
+        f"No se pudieron obtener las entregas del curso {course_id}.", on_page
+    )
+    return [rest_submission(node) for node in nodes]
+
+# Todo lo que necesita el reporte de un curso con tareas, en tantas consultas como páginas tenga
+# la conexión más larga (normalmente las entregas), en vez de recorrer cada endpoint REST por separado.
+# Con with_submissions=False no se piden entregas (se actualizan aparte, sobre la foto en caché)
+def get_course_bundle(course_id, on_page=None, with_submissions=True):
+    error_message = f"No se pudo obtener la información del curso {course_id}."
+    connections = ("enrollments", "assignments", "submissions")
+    nodes = {name: [] for name in connections}
+    cursors = {name: None for name in connections}
+    pending = set(connections) if with_submissions else {"enrollments", "assignments"}
+    course = None
+    pages = 0
+    while pending:
+        variables = {"courseId": str(course_id), "first": PAGE_SIZE}
+        for name in connections:
+            variables[f"{name}After"] = cursors[name]
+            variables[f"with{name.capitalize()}"] = name in pending
+        course = root_object(graphql_query(COURSE_BUNDLE, variables, error_message), "course", error_message)
+        for name in list(pending):
+            page = course[f"{name}Connection"]
+            nodes[name].extend(page['nodes'])
+            if page['pageInfo']['hasNextPage']:
+                cursors[name] = page['pageInfo']['endCursor']
+            else:
+                pending.discard(name)
+        pages += 1
+        metrics.record_page(graphql_url())
+        if on_page:
+            on_page(pages, sum(len(items) for items in nodes.values()))
+
+    return {
+        'course': {
+            "id": rest_id(course['_id']),
+            "name": course['name'],
+            "account_id": rest_id((course.get('account') or {}).get('_id')),
+        },
+        'students': [rest_enrollment(node) for node in nodes['enrollments']],
+        'assignments': [rest_assignment(node) for node in nodes['assignments']],
+        'submissions': [rest_submission(node) for node in nodes['submissions']],
+    }
@@ -0,0 +1,131 @@
+import requests
+from decouple import config
+import time
+import random
+import threading
+from types import SimpleNamespace
+
+import metrics
+
+# Transporte HTTP hacia la API de Canvas: configuración de conexión, sesión compartida, reintentos,
+# control de la cuota y tope de consultas por segundo. Lo usan canvas.py (REST) y canvas_graphql.py
+
+# Configuración inicial
+BASE_URL = config("CANVAS_URL", default='https://canvas.uautonoma.cl/api/v1')
+TOKEN = config("TOKEN")
+HEADERS = {"Authorization": f"Bearer {TOKEN}"}
+# Cantidad máxima de cursos que se consultan en paralelo
+MAX_WORKERS = config("MAX_WORKERS", default=6, cast=int)
+# Reintentos ante throttling (403/429) o errores 5xx de Canvas
+MAX_RETRIES = config("MAX_RETRIES", default=5, cast=int)
+REQUEST_TIMEOUT = config("REQUEST_TIMEOUT", default=30, cast=float)
+# Bajo este saldo de X-Rate-Limit-Remaining (o bajo X-Request-Cost * MAX_WORKERS, si es mayor) se empieza a frenar
+RATE_LIMIT_LOW_WATERMARK = config("RATE_LIMIT_LOW_WATERMARK", default=150, cast=float)
+# Tope de consultas por segundo (0 = sin tope). En modo batch el tope se comparte entre procesos
+MAX_REQUESTS_PER_SECOND = config("MAX_REQUESTS_PER_SECOND", default=0, cast=float)
+
+# Error al consultar Canvas, el mensaje ya viene listo para mostrarse al usuario
+class CanvasError(Exception):
+    pass
+
+# Sesión compartida: reutiliza conexiones keep-alive entre páginas, cursos y threads
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS * 2))
+SESSION.mount("http://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS * 2))
+
+# Último saldo de la cuota de Canvas visto en las respuestas (compartido entre threads)
+_rate_limit = {'remaining': None, 'cost': None}
+_rate_limit_lock = threading.Lock()
+
+# Devuelve (saldo, costo) de la respuesta, None si Canvas no los informó
+def _update_rate_limit(response):
+    remaining = response.headers.get("X-Rate-Limit-Remaining")
+    remaining = float(remaining) if remaining is not None else None
+    cost = response.headers.get("X-Request-Cost")
+    cost = float(cost) if cost is not None else None
+    with _rate_limit_lock:
+        if remaining is not None:
+            _rate_limit['remaining'] = remaining
+        if cost is not None:
+            _rate_limit['cost'] = cost
+    return remaining, cost
+
+def _throttle():
+    # Cada consulta descuenta de antemano el último costo visto, así los threads que esperan ven un
+    # saldo cada vez menor y no salen todos juntos; la próxima respuesta trae el saldo real
+    with _rate_limit_lock:
+        remaining = _rate_limit['remaining']
+        cost = _rate_limit['cost'] or 0.0
+        if remaining is not None:
+            _rate_limit['remaining'] = remaining - cost
+    # Con consultas caras se frena antes: MAX_WORKERS consultas en paralelo gastan cost * MAX_WORKERS
+    watermark = max(RATE_LIMIT_LOW_WATERMARK, cost * MAX_WORKERS)
+    if remaining is None or remaining >= watermark:
+        return
+    # Mientras más cerca de agotar la cuota, más larga la pausa (máximo ~2 s)
+    pressure = 1 - max(remaining, 0) / watermark
+    time.sleep(2 * pressure + random.uniform(0, 0.25))
+
+# Reparte las consultas a intervalos regulares. next_slot y lock pueden ser un multiprocessing.Value
+# y un multiprocessing.Lock para que el tope sea global entre varios procesos
+class RequestPacer:
+    def __init__(self, max_per_second, next_slot=None, lock=None):
+        self.interval = 1 / max_per_second if max_per_second > 0 else 0
+        self.next_slot = next_slot if next_slot is not None else SimpleNamespace(value=0.0)
+        self.lock = lock if lock is not None else threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.time()
+            slot = max(now, self.next_slot.value)
+            self.next_slot.value = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+PACER = RequestPacer(MAX_REQUESTS_PER_SECOND)
+
+def set_request_rate(max_per_second, next_slot=None, lock=None):
+    global PACER
+    PACER = RequestPacer(max_per_second, next_slot, lock)
+
+def _is_throttled(response):
+    return response.status_code == 429 or (response.status_code == 403 and "Rate Limit Exceeded" in response.text)
+
+def _backoff(attempt, response=None):
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        delay = float(retry_after)
+    else:
+        delay = min(30, 0.5 * 2 ** attempt)
+    # Jitter completo para que los threads no reintenten todos al mismo tiempo
+    time.sleep(random.uniform(delay / 2, delay))
+
+# Consulta a Canvas con reintentos; los errores HTTP definitivos se devuelven para que los maneje quien llama
+def canvas_request(method, url, params=None, headers=None, json=None):
+    for attempt in range(MAX_RETRIES + 1):
+        _throttle()
+        PACER.wait()
+        start = time.perf_counter()
+        try:
+            response = SESSION.request(method, url, params=params, headers=headers, json=json, timeout=REQUEST_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout):
+            metrics.record_request(url, time.perf_counter() - start, retry=attempt > 0)
+            if attempt == MAX_RETRIES:
+                raise
+            _backoff(attempt)
+            continue
+        remaining, cost = _update_rate_limit(response)
+        metrics.record_request(
+            url, time.perf_counter() - start, len(response.content), response.status_code,
+            cost, remaining, retry=attempt > 0
+        )
+        if (_is_throttled(response) or response.status_code >= 500) and attempt < MAX_RETRIES:
+            _backoff(attempt, response)
+            continue
+        return response
+
+def canvas_get(url, params=None, headers=None):
+    return canvas_request("GET", url, params=params, headers=headers)
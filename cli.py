@@ -0,0 +1,189 @@
+import argparse
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import requests
+
+import canvas_http
+import metrics
+from report import fetch_courses, collect_results, build_report, export_report, account_courses, ColumnarExport
+
+# Generación de reportes sin navegador, pensada para correr de noche sobre muchos diplomados.
+#
+#   python cli.py --cursos 101 102 103 --salida reportes/
+#   python cli.py --archivo diplomados.txt --salida reportes/ --tareas --procesos 4
+#   python cli.py --subcuenta 345 --periodo 12 --salida reportes/ --tareas
+#   python cli.py --cursos 101 102 --salida reportes/ --tareas --tablas
+#
+# El archivo tiene un diplomado por línea, "Nombre: id1, id2 id3". El nombre es opcional
+# (sin él se usa el nombre de la subcuenta en Canvas) y las líneas con # se ignoran.
+# Termina con código 1 si algún curso o diplomado falló.
+
+def read_diplomados_file(path):
+    diplomados = []
+    with open(path, encoding="utf-8") as f:
+        for line_num, line in enumerate(f, start=1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            name, _, ids = line.rpartition(":")
+            course_ids = list(dict.fromkeys(c for c in ids.replace(",", " ").split() if c.isdigit()))
+            if not course_ids:
+                raise ValueError(f"{path}:{line_num}: no hay IDs de curso válidos")
+            diplomados.append((name.strip() or None, course_ids))
+    return diplomados
+
+def safe_file_name(name):
+    return re.sub(r'[\\/:*?"<>|]', '_', name).strip() or "Diplomado"
+
+# Cada proceso de trabajo usa el mismo tope de consultas por segundo, compartido entre todos
+def init_worker(max_per_second, next_slot, lock):
+    canvas_http.set_request_rate(max_per_second, next_slot, lock)
+
+# Procesa un diplomado completo y escribe su .xlsx. Se ejecuta dentro de un proceso de trabajo
+# course_infos: cursos de Canvas ya conocidos (modo subcuenta), para no volver a pedirlos.
+# save_tables: escribir también las tablas Parquet/CSV, curso a curso a medida que se descargan
+def run_diplomado(name, course_ids, output_dir, include_assignments, only_non_participants, save_metrics=False,
+                  course_infos=None, save_tables=False):
+    start_time = time.time()
+    # Las tablas se escriben en una carpeta temporal y se renombran con el nombre del diplomado,
+    # que recién se conoce al terminar la descarga
+    tables_dir = tempfile.mkdtemp(prefix=".tablas-", dir=output_dir) if save_tables else None
+    try:
+        with metrics.use(metrics.RunMetrics()) as run_metrics:
+            tables = ColumnarExport(tables_dir) if save_tables else None
+            try:
+                with metrics.stage("Descarga y proceso de cursos"):
+                    results, errors, diplomado_name = collect_results(fetch_courses(
+                        course_ids, include_assignments, course_infos=course_infos,
+                        on_result=tables.add_course if tables else None
+                    ))
+            finally:
+                if tables:
+                    with metrics.stage("Tablas Parquet/CSV"):
+                        tables.close()
+            name = name or diplomado_name
+            outcome = write_report(name, results, errors, output_dir, include_assignments, only_non_participants)
+        if save_metrics:
+            with open(os.path.join(output_dir, f"{safe_file_name(name)}.metricas.json"), "w", encoding="utf-8") as f:
+                f.write(run_metrics.to_json())
+        if tables_dir and results:
+            for file_name in os.listdir(tables_dir):
+                os.replace(os.path.join(tables_dir, file_name), os.path.join(output_dir, f"{safe_file_name(name)}.{file_name}"))
+    finally:
+        if tables_dir:
+            shutil.rmtree(tables_dir, ignore_errors=True)
+    return dict(outcome, seconds=time.time() - start_time)
+
+# Escribe el .xlsx del diplomado (dentro de la medición de run_diplomado)
+def write_report(name, results, errors, output_dir, include_assignments, only_non_participants):
+    path = None
+    if results:
+        with metrics.stage("Vistas y resumen"):
+            _, course_sheets, summary = build_report(results, include_assignments, only_non_participants)
+        path = os.path.join(output_dir, f"{safe_file_name(name)}.xlsx")
+        with metrics.stage("Excel"):
+            export_report(path, course_sheets, summary, name)
+    else:
+        errors.append(f"{name}: ningún curso devolvió estudiantes, no se generó el reporte.")
+    return {
+        'name': name,
+        'path': path,
+        'courses': len(results),
+        'errors': errors,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Genera reportes de participación de Canvas sin abrir la app.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--cursos", nargs="+", metavar="ID", help="IDs de los cursos de un diplomado, separados por espacios o comas, en el orden del reporte")
+    source.add_argument("--archivo", help="archivo con un diplomado por línea: 'Nombre: id1, id2 ...'")
+    source.add_argument("--subcuenta", type=int, metavar="ID", help="procesar todos los cursos de una subcuenta de Canvas")
+    parser.add_argument("--periodo", type=int, metavar="ID", help="con --subcuenta, solo los cursos de este periodo académico")
+    parser.add_argument("--estados", nargs="+", default=["available"],
+                        choices=["available", "created", "claimed", "completed"],
+                        help="con --subcuenta, estados de curso a incluir (por defecto available)")
+    parser.add_argument("--salida", default=".", help="carpeta donde se escriben los .xlsx (por defecto la actual)")
+    parser.add_argument("--tareas", action="store_true", help="incluir entregas en tareas y la hoja Resumen Diplomado")
+    parser.add_argument("--solo-no-participantes", action="store_true", help="exportar solo a quienes no han participado")
+    parser.add_argument("--tablas", action="store_true",
+                        help="escribir también las tablas tipadas <nombre>.<tabla>.parquet y .csv (estudiantes, entregas, resumen)")
+    parser.add_argument("--metricas", action="store_true", help="guardar junto a cada reporte un .metricas.json con consultas y tiempos")
+    parser.add_argument("--procesos", type=int, default=min(4, os.cpu_count() or 1), help="diplomados procesados en paralelo")
+    parser.add_argument("--max-consultas-por-segundo", type=float, default=canvas_http.MAX_REQUESTS_PER_SECOND or 10,
+                        help="tope global de consultas a Canvas entre todos los procesos (0 = sin tope)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    course_infos = None
+    if args.archivo:
+        try:
+            diplomados = read_diplomados_file(args.archivo)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 2
+    elif args.subcuenta:
+        try:
+            course_ids, course_infos = account_courses(args.subcuenta, args.periodo, args.estados)
+        except (canvas_http.CanvasError, requests.RequestException) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        if not course_ids:
+            print(f"Error: la subcuenta {args.subcuenta} no tiene cursos con esos filtros.", file=sys.stderr)
+            return 2
+        diplomados = [(None, course_ids)]
+    else:
+        # Como en la app y en el archivo de diplomados: IDs separados por espacios y/o comas ("101,102 103")
+        values = " ".join(args.cursos).replace(",", " ").split()
+        invalid = [c for c in values if not c.isdigit()]
+        if invalid:
+            print(f"Aviso: se ignoran IDs de curso no numéricos: {' '.join(invalid)}", file=sys.stderr)
+        course_ids = list(dict.fromkeys(c for c in values if c.isdigit()))
+        if not course_ids:
+            print("Error: no se han ingresado IDs de curso válidos.", file=sys.stderr)
+            return 2
+        diplomados = [(None, course_ids)]
+    os.makedirs(args.salida, exist_ok=True)
+
+    # "spawn" para que cada proceso abra su propia sesión HTTP y su conexión a la caché
+    context = multiprocessing.get_context("spawn")
+    next_slot = context.Value('d', 0.0, lock=False)
+    lock = context.Lock()
+    failed = False
+    with ProcessPoolExecutor(
+        max_workers=max(1, min(args.procesos, len(diplomados))), mp_context=context,
+        initializer=init_worker, initargs=(args.max_consultas_por_segundo, next_slot, lock)
+    ) as executor:
+        futures = {
+            executor.submit(
+                run_diplomado, name, course_ids, args.salida, args.tareas, args.solo_no_participantes, args.metricas, course_infos,
+                args.tablas
+            ): (name, course_ids)
+            for (name, course_ids) in diplomados
+        }
+        for future in as_completed(futures):
+            name, course_ids = futures[future]
+            try:
+                outcome = future.result()
+            except Exception as e:
+                failed = True
+                print(f"ERROR {name or ' '.join(course_ids)}: {e}", file=sys.stderr)
+                continue
+            for error in outcome['errors']:
+                print(f"ERROR {outcome['name']}: {error}", file=sys.stderr)
+            if outcome['errors']:
+                failed = True
+            if outcome['path']:
+                print(f"OK    {outcome['name']}: {outcome['courses']} cursos -> {outcome['path']} ({outcome['seconds']:.1f} s)")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+import contextvars
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# Métricas de una ejecución: consultas a Canvas por endpoint, cuota consumida y tiempos por etapa
+# y por curso. El colector activo viaja en un contextvar; iter_courses copia el contexto a cada
+# thread, así las funciones de canvas.py registran sin recibir el colector como parámetro.
+_current = contextvars.ContextVar("metrics", default=None)
+
+class RunMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.endpoints = {}
+        self.stages = []
+        self.rate_limit = {'cost': 0.0, 'first_remaining': None, 'last_remaining': None, 'min_remaining': None}
+
+    def _endpoint(self, url):
+        name = endpoint_name(url)
+        if name not in self.endpoints:
+            self.endpoints[name] = {
+                'requests': 0, 'retries': 0, 'errors': 0, 'pages': 0, 'cache_hits': 0, 'not_modified': 0,
+                'bytes': 0, 'latency_total': 0.0, 'latency_max': 0.0, 'cost': 0.0
+            }
+        return self.endpoints[name]
+
+    def record_request(self, url, latency, size=0, status=None, cost=None, remaining=None, retry=False):
+        with self.lock:
+            endpoint = self._endpoint(url)
+            endpoint['requests'] += 1
+            endpoint['retries'] += 1 if retry else 0
+            endpoint['errors'] += 1 if status is None or status >= 400 else 0
+            endpoint['not_modified'] += 1 if status == 304 else 0
+            endpoint['bytes'] += size
+            endpoint['latency_total'] += latency
+            endpoint['latency_max'] = max(endpoint['latency_max'], latency)
+            if cost is not None:
+                endpoint['cost'] += cost
+                self.rate_limit['cost'] += cost
+            if remaining is not None:
+                if self.rate_limit['first_remaining'] is None:
+                    self.rate_limit['first_remaining'] = remaining
+                self.rate_limit['last_remaining'] = remaining
+                current_min = self.rate_limit['min_remaining']
+                self.rate_limit['min_remaining'] = remaining if current_min is None else min(current_min, remaining)
+
+    def record_page(self, url):
+        with self.lock:
+            self._endpoint(url)['pages'] += 1
+
+    def record_cache_hit(self, url):
+        with self.lock:
+            self._endpoint(url)['cache_hits'] += 1
+
+    def record_stage(self, name, seconds, course_id=None):
+        with self.lock:
+            self.stages.append({'stage': name, 'course_id': course_id, 'seconds': seconds})
+
+    def to_dict(self):
+        with self.lock:
+            endpoints = {
+                name: dict(values, latency_avg=values['latency_total'] / values['requests'] if values['requests'] else 0.0)
+                for name, values in self.endpoints.items()
+            }
+            return {
+                'started_at': self.started_at,
+                'requests': sum(e['requests'] for e in endpoints.values()),
+                'endpoints': endpoints,
+                'rate_limit': dict(self.rate_limit),
+                'stages': list(self.stages),
+            }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2, ensure_ascii=False)
+
+# "/api/v1/courses/123/students/submissions?page=2" -> "/courses/:id/students/submissions"
+def endpoint_name(url):
+    path = urlparse(url).path
+    path = re.sub(r'^.*/api/v1', '', path)
+    return re.sub(r'/\d+', '/:id', path)
+
+def current():
+    return _current.get()
+
+# Activa un colector mientras dura el bloque
+@contextmanager
+def use(run_metrics):
+    token = _current.set(run_metrics)
+    try:
+        yield run_metrics
+    finally:
+        _current.reset(token)
+
+# Mide el tiempo de una etapa (global o de un curso) en el colector activo, si hay uno
+@contextmanager
+def stage(name, course_id=None):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        run_metrics = _current.get()
+        if run_metrics is not None:
+            run_metrics.record_stage(name, time.perf_counter() - start, course_id)
+
+def record_request(url, latency, size=0, status=None, cost=None, remaining=None, retry=False):
+    run_metrics = _current.get()
+    if run_metrics is not None:
+        run_metrics.record_request(url, latency, size, status, cost, remaining, retry)
+
+def record_page(url):
+    run_metrics = _current.get()
+    if run_metrics is not None:
+        run_metrics.record_page(url)
+
+def record_cache_hit(url):
+    run_metrics = _current.get()
+    if run_metrics is not None:
+        run_metrics.record_cache_hit(url)
@@ -0,0 +1,610 @@
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import os
+import requests
+import queue
+import contextvars
+import threading
+import hashlib
+import re
+import xlsxwriter
+from concurrent.futures import Future, ThreadPoolExecutor
+from unidecode import unidecode
+
+import metrics
+from canvas_http import MAX_WORKERS, CanvasError
+from canvas import (
+    get_students, get_course_info, get_subaccount_info,
+    get_account_courses, get_assignments, get_delivered_by_assignment, get_course_bundle, uses_course_bundle
+)
+
+# Texto respaldado por Arrow: las operaciones .str corren en bloque y no celda a celda en Python
+TEXT = "string[pyarrow]"
+CHECK = "✔️"
+CROSS = "❌"
+# Hojas del Excel: la del resumen y el largo máximo que admite Excel para un nombre de hoja
+SUMMARY_SHEET = "Resumen Diplomado"
+MAX_SHEET_NAME = 31
+
+# Fechas de Canvas ("2024-03-01T12:30:00Z") a datetime64[s] en UTC; vacías o inválidas quedan NaT
+def parse_canvas_dates(dates):
+    parsed = pc.strptime(pa.array(dates, type=pa.string(), from_pandas=True), format="%Y-%m-%dT%H:%M:%SZ", unit="s", error_is_null=True)
+    return pd.Series(parsed.to_numpy(zero_copy_only=False), index=dates.index)
+
+# datetime64 a "01-03-2024 12:30" (NaT queda como nulo)
+def format_dates(dates):
+    return dates.astype("timestamp[s][pyarrow]").dt.strftime("%d-%m-%Y %H:%M").astype(TEXT)
+
+# Enteros a texto con al menos dos dígitos (5 -> "05", 123 -> "123")
+def two_digits(numbers, dtype):
+    as_text = numbers.astype(dtype)
+    return ('0' + as_text).where(numbers < 10, as_text)
+
+# Segundos a "HH:MM:SS" (las horas pueden pasar de 99)
+def format_duration(seconds):
+    return two_digits(seconds // 3600, TEXT) + ":" + two_digits((seconds % 3600) // 60, TEXT) + ":" + two_digits(seconds % 60, TEXT)
+
+def check_marks(flags):
+    return pd.Series(np.where(flags, CHECK, CROSS), index=flags.index)
+
+# Tabla de estudiantes a partir de las inscripciones, con tipos compactos: nombres categóricos,
+# fechas datetime64, actividad en segundos y participación booleana. El texto con emojis y
+# fechas formateadas se arma recién al mostrar o exportar (format_students_df)
+def build_students_df(students):
+    raw = pd.DataFrame.from_records(students, columns=["created_at", "last_activity_at", "total_activity_time", "user"])
+    users = pd.DataFrame.from_records(
+        [u if isinstance(u, dict) else {} for u in raw["user"]],
+        columns=["id", "sortable_name", "sis_user_id", "login_id"]
+    )
+
+    # sortable_name viene como "Apellidos, Nombres"
+    names = users['sortable_name'].astype(TEXT).fillna('').str.split(',', n=2, expand=True).reindex(columns=[0, 1]).fillna('')
+
+    rut = users['sis_user_id'].astype(TEXT)
+    rut = (rut.str.slice(stop=-1) + '-' + rut.str.slice(-1)).where(rut.str.len() > 1, None)
+
+    # Participó si Canvas informa alguna última actividad, aunque la fecha no se pueda leer
+    has_activity = raw['last_activity_at'].astype(TEXT).fillna('').str.len() > 0
+
+    return pd.DataFrame({
+        "Nombres": names[1].str.strip().astype("category"),
+        "Apellidos": names[0].str.strip().astype("category"),
+        "RUT": rut,
+        "Correo": users['login_id'].astype(TEXT),
+        "Matriculado": parse_canvas_dates(raw['created_at']),
+        "Ultima actividad": parse_canvas_dates(raw['last_activity_at']),
+        "Ha participado": has_activity.astype(bool),
+        "Actividad total": raw['total_activity_time'].fillna(0).astype('int64'),
+        "user_id": users['id'],
+    })
+
+# Versión para mostrar o exportar de una tabla de build_students_df (o de una parte de ella):
+# fechas como texto, actividad en HH:MM:SS y ✔️/❌ en la participación y en cada tarea
+def format_students_df(df, task_columns=()):
+    formatted = df.copy()
+    formatted["Nombres"] = df["Nombres"].astype(TEXT)
+    formatted["Apellidos"] = df["Apellidos"].astype(TEXT)
+    formatted["Matriculado"] = format_dates(df["Matriculado"])
+    formatted["Ultima actividad"] = format_dates(df["Ultima actividad"]).fillna("Nunca")
+    formatted["Ha participado"] = check_marks(df["Ha participado"])
+    formatted["Actividad total"] = format_duration(df["Actividad total"])
+    for task_name in task_columns:
+        formatted[task_name] = check_marks(df[task_name])
+    return formatted
+
+# La ejecución se canceló (por ejemplo, el usuario abandonó la página): el curso se deja a medias
+class Cancelled(Exception):
+    pass
+
+# Envuelve fetch(clave) para que cada clave se consulte una sola vez por ejecución: el primer
+# thread que la pide hace la consulta y los demás esperan ese mismo resultado (o error)
+def once_per_key(fetch):
+    futures = {}
+    lock = threading.Lock()
+
+    def get(key):
+        with lock:
+            future = futures.get(key)
+            owner = future is None
+            if owner:
+                future = futures[key] = Future()
+        if owner:
+            try:
+                future.set_result(fetch(key))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+    return get
+
+# Descarga y procesa un curso completo, devuelve None si el curso no tiene estudiantes.
+# progress(mensaje) recibe el avance (páginas de inscripciones, entregas y tareas procesadas).
+# course_info evita pedir el curso si ya se conoce (modo subcuenta) y get_account permite
+# compartir las consultas de subcuentas entre cursos
+def process_course(course_id, include_assignments, progress=None, course_info=None, get_account=get_subaccount_info):
+    progress = progress or (lambda message: None)
+    # Con el backend GraphQL el curso con tareas llega completo en una sola consulta paginada
+    bundle = None
+    if include_assignments and uses_course_bundle():
+        with metrics.stage("Curso completo (GraphQL)", course_id):
+            bundle = get_course_bundle(course_id, on_page=lambda pages, count: progress(f"Curso, tareas y entregas: {pages} páginas, {count} registros"))
+    if bundle:
+        students = bundle['students']
+        course_info = course_info or bundle['course']
+    else:
+        with metrics.stage("Inscripciones", course_id):
+            students = get_students(course_id, on_page=lambda pages, count: progress(f"Inscripciones: {pages} páginas, {count} estudiantes"))
+    if not students:
+        return None
+
+    with metrics.stage("Tabla de estudiantes", course_id):
+        df = build_students_df(students)
+
+    with metrics.stage("Curso y subcuenta", course_id):
+        course_info = course_info or get_course_info(course_id)
+        # Si falla la subcuenta el curso igual se reporta, como "Subcuenta desconocida"
+        errors = []
+        try:
+            sub_account_info = get_account(course_info.get("account_id"))
+        except CanvasError as e:
+            errors.append(str(e))
+            sub_account_info = None
+
+    # Procesar tareas (user_id se mantiene: identifica al estudiante en el resumen del diplomado).
+    # Cada tarea es una columna booleana: entregó o no. task_ids guarda el id de Canvas de cada columna
+    task_columns = []
+    task_ids = {}
+    if include_assignments:
+        with metrics.stage("Tareas", course_id):
+            assignments = bundle['assignments'] if bundle else get_assignments(course_id)
+        filtered_assignments = []
+        for a in assignments:
+            normalized_name = unidecode(a['name'].lower())
+            if 'autoevaluacion' not in normalized_name:
+                filtered_assignments.append(a)
+
+        progress(f"Tareas: {len(filtered_assignments)} encontradas, descargando entregas")
+        with metrics.stage("Entregas", course_id):
+            if not filtered_assignments:
+                delivered_by_assignment = {}
+            elif bundle:
+                delivered_by_assignment = bundle['delivered']
+            else:
+                delivered_by_assignment = get_delivered_by_assignment(
+                    course_id, on_page=lambda pages, count: progress(f"Entregas: {pages} páginas, {count} entregas")
+                )
+        with metrics.stage("Columnas de tareas", course_id):
+            for i, a in enumerate(filtered_assignments, start=1):
+                delivered = delivered_by_assignment.get(a['id'], set())
+                task_name = a['name']
+                df[task_name] = df['user_id'].isin(delivered)
+                task_ids[task_name] = a['id']
+                if task_name not in task_columns:
+                    task_columns.append(task_name)
+                progress(f"Tareas procesadas: {i} / {len(filtered_assignments)}")
+
+    participantes_count = int(df["Ha participado"].sum())
+    no_participantes_count = len(df) - participantes_count
+
+    return {
+        'df': df,
+        'task_columns': task_columns,
+        'task_ids': task_ids,
+        'participantes_count': participantes_count,
+        'no_participantes_count': no_participantes_count,
+        'course_info': course_info,
+        'sub_account_info': sub_account_info,
+        'errors': errors
+    }
+
+# Procesa los cursos en paralelo y va entregando eventos a medida que ocurren:
+#   (course_id, 'progress', mensaje)
+#   (course_id, 'done', (resultado, error))   apenas termina cada curso, en orden de llegada
+# Los threads solo encolan eventos; quien consume el generador (el thread de Streamlit) dibuja.
+# course_infos: {course_id: curso de Canvas} ya conocidos, para no volver a pedirlos.
+# Si el generador se cierra antes de terminar (close() o se abandona), los cursos que no
+# empezaron se descartan y los que están en curso se detienen en su siguiente página
+def iter_courses(course_ids, include_assignments, max_workers=MAX_WORKERS, course_infos=None):
+    events = queue.Queue()
+    cancelled = threading.Event()
+    course_infos = course_infos or {}
+    # Los cursos de un diplomado suelen compartir subcuenta: se consulta una vez por ejecución
+    get_account = once_per_key(get_subaccount_info)
+
+    def report_progress(course_id, message):
+        if cancelled.is_set():
+            raise Cancelled()
+        events.put((course_id, 'progress', message))
+
+    def run(course_id):
+        if cancelled.is_set():
+            return
+        try:
+            with metrics.stage("Curso completo", course_id):
+                result = process_course(
+                    course_id, include_assignments, lambda message: report_progress(course_id, message),
+                    course_infos.get(course_id), get_account
+                )
+            outcome = (result, None)
+        except Cancelled:
+            return
+        except CanvasError as e:
+            outcome = (None, str(e))
+        except requests.RequestException as e:
+            outcome = (None, f"Error de conexión con Canvas en el curso {course_id}: {e}")
+        except Exception as e:
+            outcome = (None, f"Error inesperado procesando el curso {course_id}: {e}")
+        events.put((course_id, 'done', outcome))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(course_ids))))
+    try:
+        for course_id in course_ids:
+            # Cada thread recibe una copia del contexto, con el colector de métricas activo
+            executor.submit(contextvars.copy_context().run, run, course_id)
+        pending = len(course_ids)
+        while pending:
+            event = events.get()
+            if event[1] == 'done':
+                pending -= 1
+            yield event
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# Cursos de una subcuenta como (course_ids, course_infos) listos para iter_courses / fetch_courses
+def account_courses(account_id, term_id=None, states=None):
+    courses = get_account_courses(account_id, term_id, states)
+    course_ids = [str(course['id']) for course in courses]
+    return course_ids, {str(course['id']): course for course in courses}
+
+# Procesa todos los cursos y devuelve (course_id, resultado, error) en el mismo orden de course_ids.
+# on_result(course_id, resultado) se llama con cada curso exitoso apenas termina (p. ej. ColumnarExport.add_course)
+def fetch_courses(course_ids, include_assignments, max_workers=MAX_WORKERS, course_infos=None, on_result=None):
+    outcomes = {}
+    for course_id, kind, payload in iter_courses(course_ids, include_assignments, max_workers, course_infos):
+        if kind == 'done':
+            outcomes[course_id] = payload
+            result, error = payload
+            if on_result and result is not None and not error:
+                on_result(course_id, result)
+    return [(course_id, *outcomes[course_id]) for course_id in course_ids]
+
+# Junta los resultados en el orden de course_ids. outcomes: [(course_id, resultado, error)]
+# Devuelve (results, errores, nombre del diplomado)
+def collect_results(outcomes):
+    results = {}
+    errors = []
+    diplomado_name = None
+    for course_id, result, error in outcomes:
+        if error:
+            errors.append(error)
+            continue
+        if result is None:
+            continue
+        errors.extend(result.pop('errors'))
+
+        sub_account_info = result['sub_account_info']
+        if diplomado_name is None and sub_account_info:
+            diplomado_name = sub_account_info.get('name', 'Diplomado')
+
+        results[course_id] = result
+    return results, errors, diplomado_name if diplomado_name else "Diplomado"
+
+# Resumen del diplomado en una sola pasada: cada curso aporta un bloque de columnas indexado por
+# user_id y se unen todos con un único concat alineado por índice (los homónimos no se mezclan).
+# course_tables: [(nombre del curso, df con user_id, Nombres, Apellidos y las columnas del curso)]
+# Devuelve (summary_df, task_intervals) con los intervalos de columnas de cada curso para merge_range
+def build_summary(course_tables):
+    names = []
+    blocks = []
+    task_intervals = []
+    current_col = 2
+    for (course_name, df) in course_tables:
+        indexed = df.drop_duplicates(subset="user_id").set_index("user_id")
+        names.append(indexed[["Nombres", "Apellidos"]])
+        block = indexed.drop(columns=["Nombres", "Apellidos"])
+        blocks.append(block)
+        num_columns = block.shape[1]
+        if num_columns > 0:
+            task_intervals.append((course_name, current_col, current_col + num_columns - 1))
+            current_col += num_columns
+
+    # Nombres tomados del primer curso donde aparece cada estudiante
+    names_df = pd.concat(names)
+    names_df = names_df[~names_df.index.duplicated(keep='first')]
+
+    summary_df = pd.concat([names_df] + blocks, axis=1, join="outer").fillna("")
+    # Eliminar filas donde Nombres o Apellidos estén vacíos
+    summary_df = summary_df[(summary_df["Nombres"] != "") & (summary_df["Apellidos"] != "")]
+    summary_df = summary_df.sort_values(by=["Apellidos", "Nombres"], kind="stable").reset_index(drop=True)
+    return summary_df, task_intervals
+
+# Formatos compartidos por las hojas del reporte
+def add_report_formats(workbook):
+    return {
+        'title': workbook.add_format({'bold': True, 'font_size': 14}),
+        'subtitle': workbook.add_format({'italic': True, 'font_size': 12}),
+        'center': workbook.add_format({'align': 'center'}),
+        'border': workbook.add_format({
+            'border': 1,
+            'align': 'center',
+            'valign': 'vcenter'
+        }),
+        'header': workbook.add_format({
+            'bold': True,
+            'text_wrap': True,
+            'valign': 'top',
+            'border': 1
+        }),
+        'summary_header': workbook.add_format({
+            'bold': True,
+            'text_wrap': True,
+            'valign': 'top',
+            'border': 1,
+            'align': 'center'
+        }),
+        # Solo cambian el color de la fuente, el borde y la alineación vienen de 'border'
+        'check': workbook.add_format({'font_color': 'green'}),
+        'cross': workbook.add_format({'font_color': 'red'}),
+    }
+
+# Escribe la tabla fila por fila (una llamada por fila, compatible con constant_memory)
+# y colorea ✔️/❌ con formato condicional sobre todo el rango en vez de celda a celda
+def write_table(worksheet, first_row, df, formats):
+    for row_num, row in enumerate(df.itertuples(index=False, name=None)):
+        worksheet.write_row(first_row + row_num, 0, row, formats['border'])
+
+    max_row, max_col = df.shape
+    if max_row and max_col:
+        last_row = first_row + max_row - 1
+        worksheet.conditional_format(first_row, 0, last_row, max_col - 1, {
+            'type': 'cell', 'criteria': '==', 'value': '"✔️"', 'format': formats['check']
+        })
+        worksheet.conditional_format(first_row, 0, last_row, max_col - 1, {
+            'type': 'cell', 'criteria': '==', 'value': '"❌"', 'format': formats['cross']
+        })
+
+def write_course_sheet(workbook, formats, df, diplomado, curso, sheet_name):
+    worksheet = workbook.add_worksheet(sheet_name)
+    worksheet.write(0, 0, diplomado, formats['title'])
+    worksheet.write(1, 0, curso, formats['subtitle'])
+
+    max_col = df.shape[1]
+    worksheet.set_column(0, max_col - 1, 20, formats['center'])
+    worksheet.set_column(0, 0, 30) # Nombres
+    worksheet.set_column(1, 1, 30) # Apellidos
+    worksheet.set_column(3, 3, 40) # Correo más ancho
+
+    worksheet.write_row(3, 0, list(df.columns), formats['header'])
+    write_table(worksheet, 4, df, formats)
+    worksheet.set_default_row(20)
+
+def write_summary_sheet(workbook, formats, summary_df, task_intervals, diplomado_name):
+    worksheet = workbook.add_worksheet(SUMMARY_SHEET)
+    worksheet.write(0, 0, diplomado_name, formats['title'])
+
+    max_col = summary_df.shape[1]
+    worksheet.set_column(0, 0, 30) # Nombres
+    worksheet.set_column(1, 1, 30) # Apellidos
+    worksheet.set_column(2, max_col - 1, 20)
+
+    for (course_name, start_col, end_col) in task_intervals:
+        if start_col == end_col:
+            worksheet.write(2, start_col, course_name, formats['summary_header'])
+        else:
+            worksheet.merge_range(2, start_col, 2, end_col, course_name, formats['summary_header'])
+
+    worksheet.write_row(3, 0, list(summary_df.columns), formats['summary_header'])
+    write_table(worksheet, 4, summary_df, formats)
+    worksheet.set_default_row(20)
+
+# Genera el .xlsx en path. course_sheets: [(df, diplomado, curso, sheet_name)];
+# summary: (summary_df, task_intervals) o None. Con constant_memory cada fila se
+# escribe a disco apenas se completa, así el libro nunca está entero en memoria
+def export_report(path, course_sheets, summary, diplomado_name, constant_memory=True):
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': constant_memory})
+    formats = add_report_formats(workbook)
+    for (df, diplomado, curso, sheet_name) in course_sheets:
+        write_course_sheet(workbook, formats, df, diplomado, curso, sheet_name)
+    if summary is not None:
+        summary_df, task_intervals = summary
+        write_summary_sheet(workbook, formats, summary_df, task_intervals, diplomado_name)
+    workbook.close()
+
+# Tablas tipadas para análisis (DuckDB, pandas): un registro por estudiante y curso, uno por
+# estudiante, curso y tarea, y un resumen por estudiante. Sin emojis ni fechas formateadas
+TIMESTAMP = pa.timestamp("s", tz="UTC")
+COLUMNAR_SCHEMAS = {
+    'estudiantes': pa.schema([
+        ("generado_en", TIMESTAMP), ("account_id", pa.int64()), ("diplomado", pa.string()),
+        ("course_id", pa.int64()), ("curso", pa.string()), ("user_id", pa.int64()),
+        ("nombres", pa.string()), ("apellidos", pa.string()), ("rut", pa.string()), ("correo", pa.string()),
+        ("matriculado", TIMESTAMP), ("ultima_actividad", TIMESTAMP), ("ha_participado", pa.bool_()),
+        ("actividad_total_segundos", pa.int64()),
+    ]),
+    'entregas': pa.schema([
+        ("generado_en", TIMESTAMP), ("course_id", pa.int64()), ("assignment_id", pa.int64()),
+        ("tarea", pa.string()), ("user_id", pa.int64()), ("entregada", pa.bool_()),
+    ]),
+    'resumen': pa.schema([
+        ("generado_en", TIMESTAMP), ("user_id", pa.int64()), ("nombres", pa.string()), ("apellidos", pa.string()),
+        ("cursos", pa.int64()), ("cursos_con_participacion", pa.int64()), ("tareas", pa.int64()),
+        ("tareas_entregadas", pa.int64()),
+    ]),
+}
+
+# Escribe las tablas en directory (<tabla>.parquet y <tabla>.csv) a medida que llegan los cursos:
+# cada curso es un row group de Parquet y un bloque del CSV, así no hace falta tener todos los
+# cursos en memoria. El resumen por estudiante se escribe al cerrar
+class ColumnarExport:
+    def __init__(self, directory):
+        self.generated_at = pd.Timestamp.now(tz="UTC").floor("s")
+        self.summary_parts = []
+        self.writers = {}
+        for name, schema in COLUMNAR_SCHEMAS.items():
+            path = os.path.join(directory, name)
+            self.writers[name] = (pq.ParquetWriter(f"{path}.parquet", schema, compression="zstd"), pa_csv.CSVWriter(f"{path}.csv", schema))
+
+    def _write(self, name, frame):
+        table = pa.Table.from_pandas(frame.assign(generado_en=self.generated_at), schema=COLUMNAR_SCHEMAS[name], preserve_index=False)
+        for writer in self.writers[name]:
+            writer.write_table(table)
+
+    def add_course(self, course_id, res):
+        df = res['df']
+        account = res['sub_account_info'] or {}
+        self._write('estudiantes', pd.DataFrame({
+            "account_id": account.get('id'),
+            "diplomado": account.get('name'),
+            "course_id": int(course_id),
+            "curso": res['course_info'].get('name'),
+            "user_id": df["user_id"],
+            "nombres": df["Nombres"].astype(TEXT),
+            "apellidos": df["Apellidos"].astype(TEXT),
+            "rut": df["RUT"],
+            "correo": df["Correo"],
+            "matriculado": df["Matriculado"].dt.tz_localize("UTC"),
+            "ultima_actividad": df["Ultima actividad"].dt.tz_localize("UTC"),
+            "ha_participado": df["Ha participado"],
+            "actividad_total_segundos": df["Actividad total"],
+        }))
+
+        # Formato largo: una fila por estudiante y tarea, tarea por tarea
+        task_columns = res['task_columns']
+        num_students = len(df)
+        flags = df[task_columns].to_numpy(dtype=bool)
+        self._write('entregas', pd.DataFrame({
+            "course_id": int(course_id),
+            "assignment_id": np.repeat([res['task_ids'][name] for name in task_columns], num_students).astype('int64'),
+            "tarea": np.repeat(task_columns, num_students).astype(object),
+            "user_id": np.tile(df["user_id"].to_numpy(), len(task_columns)),
+            "entregada": flags.T.ravel(),
+        }))
+
+        self.summary_parts.append(pd.DataFrame({
+            "user_id": df["user_id"],
+            "nombres": df["Nombres"].astype(TEXT),
+            "apellidos": df["Apellidos"].astype(TEXT),
+            "ha_participado": df["Ha participado"],
+            "tareas": len(task_columns),
+            "tareas_entregadas": flags.sum(axis=1),
+        }))
+
+    def close(self):
+        if self.summary_parts:
+            summary = pd.concat(self.summary_parts).groupby("user_id", sort=False).agg(
+                nombres=("nombres", "first"),
+                apellidos=("apellidos", "first"),
+                cursos=("ha_participado", "size"),
+                cursos_con_participacion=("ha_participado", "sum"),
+                tareas=("tareas", "sum"),
+                tareas_entregadas=("tareas_entregadas", "sum"),
+            ).reset_index()
+            self._write('resumen', summary)
+        for writers in self.writers.values():
+            for writer in writers:
+                writer.close()
+
+# Todas las tablas de resultados ya descargados, en directory
+def export_tables(directory, results):
+    tables = ColumnarExport(directory)
+    try:
+        for course_id, res in results.items():
+            tables.add_course(course_id, res)
+    finally:
+        tables.close()
+
+# Títulos de un curso para la pantalla y el Excel: (diplomado, curso, nombre limpio, nombre de hoja)
+def course_labels(course_id, res):
+    diplomado = f"{res['sub_account_info'].get('name')} - id: {res['sub_account_info'].get('id')}" if res['sub_account_info'] else "Subcuenta desconocida"
+    curso_name = res['course_info'].get('name', f"Curso_{course_id}")
+    invalid_chars = r'[\[\]\:\*\?\/\\\']'
+    curso_name_clean = re.sub(invalid_chars, '_', curso_name)
+    curso_name_clean = curso_name_clean.strip()
+    sheet_name = curso_name_clean[:MAX_SHEET_NAME]
+
+    curso = f"{curso_name_clean} - id: {res['course_info'].get('id')}" if res['course_info'] else f"Curso {course_id}"
+    return diplomado, curso, curso_name_clean, sheet_name
+
+# Excel no admite dos hojas con el mismo nombre (sin distinguir mayúsculas) ni nombres de más de
+# 31 caracteres. Los cursos de un diplomado suelen compartir un prefijo largo ("Diplomado en ... -
+# Módulo N"), así que las repetidas se numeran: "Nombre", "Nombre (2)", ... used: nombres ya tomados, en minúsculas
+def unique_sheet_name(name, used):
+    name = name or "Curso"
+    candidate = name[:MAX_SHEET_NAME]
+    n = 2
+    while candidate.lower() in used:
+        suffix = f" ({n})"
+        candidate = name[:MAX_SHEET_NAME - len(suffix)].rstrip() + suffix
+        n += 1
+    used.add(candidate.lower())
+    return candidate
+
+# Huella del contenido de los resultados: cambia solo si cambian los datos descargados,
+# así la pantalla y el Excel se pueden reutilizar entre reruns de Streamlit
+def results_fingerprint(results, include_assignments):
+    digest = hashlib.sha256(repr(include_assignments).encode())
+    for course_id, res in results.items():
+        digest.update(repr((course_id, list(res['df'].columns), res['course_info'], res['sub_account_info'])).encode())
+        digest.update(pd.util.hash_pandas_object(res['df'], index=False).values.tobytes())
+    return digest.hexdigest()
+
+# Filas de un curso en el orden del reporte: solo no participantes si se pide, ordenadas por "Apellidos"
+# sin pasar los nombres a minúsculas. Devuelve etiquetas del índice de df, no una copia de la tabla.
+# unidecode se aplica una vez por apellido distinto (las categorías) y no una vez por fila
+def course_rows(df, only_non_participants):
+    apellidos = df["Apellidos"]
+    if only_non_participants:
+        apellidos = apellidos[~df["Ha participado"]]
+    unaccented = np.asarray(apellidos.cat.categories.map(unidecode), dtype=object)
+    ordered = apellidos.sort_values(key=lambda col: pd.Series(unaccented[col.cat.codes], index=col.index))
+    return ordered.index.to_numpy()
+
+# Tabla de un curso lista para mostrar o exportar (texto con emojis y fechas), con las filas de course_rows
+def course_view(df, rows, task_columns=()):
+    return format_students_df(df.loc[rows], task_columns).fillna("").reset_index(drop=True)
+
+# Vistas de los cursos, livianas para guardarlas en la sesión de la app:
+#   [(course_id, filas, diplomado, curso, participantes, no participantes)]
+# El texto formateado se arma con course_view al dibujar cada curso y en build_sheets al exportar
+def build_views(results, only_non_participants=False):
+    views = []
+    for course_id, res in results.items():
+        diplomado, curso, _, _ = course_labels(course_id, res)
+        participated = res['df']["Ha participado"]
+        participantes_count = 0 if only_non_participants else int(participated.sum())
+        no_participantes_count = int((~participated).sum())
+        rows = course_rows(res['df'], only_non_participants)
+        views.append((course_id, rows, diplomado, curso, participantes_count, no_participantes_count))
+    return views
+
+# Hojas del Excel a partir de las vistas. Devuelve (course_sheets, summary), listos para export_report
+def build_sheets(results, views, include_assignments):
+    course_sheets = []
+    course_tables = []
+    # La hoja resumen también ocupa su nombre, aunque no se genere
+    used_sheet_names = {SUMMARY_SHEET.lower()}
+    for (course_id, rows, diplomado, curso, _, _) in views:
+        res = results[course_id]
+        _, _, curso_name_clean, sheet_name = course_labels(course_id, res)
+        sheet_name = unique_sheet_name(sheet_name, used_sheet_names)
+        df_to_show = course_view(res['df'], rows, res['task_columns'])
+        course_sheets.append((df_to_show.drop(columns=['user_id']), diplomado, curso, sheet_name))
+
+        if include_assignments:
+            columns_to_remove = ["RUT","Correo","Matriculado","Ultima actividad","Ha participado"]
+            cols_final = ["user_id", "Nombres", "Apellidos"] + [c for c in df_to_show.columns if c not in columns_to_remove + ["user_id", "Nombres", "Apellidos"]]
+            course_tables.append((curso_name_clean, df_to_show[cols_final]))
+
+    # Hoja resumen solo si hay cursos y include_assignments
+    summary = build_summary(course_tables) if include_assignments and course_tables else None
+    return course_sheets, summary
+
+# Reporte completo de una vez (modo batch y benchmarks). Devuelve (views, course_sheets, summary)
+def build_report(results, include_assignments, only_non_participants=False):
+    views = build_views(results, only_non_participants)
+    course_sheets, summary = build_sheets(results, views, include_assignments)
+    return views, course_sheets, summary
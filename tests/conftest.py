@@ -0,0 +1,9 @@
+import os
+import sys
+
+# canvas.py lee la configuración al importarse: token de prueba y sin la caché en disco del proyecto
+os.environ.setdefault("TOKEN", "test")
+os.environ["CACHE_ENABLED"] = "False"
+os.environ["CANVAS_BACKEND"] = "rest"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import openpyxl
+
+import canvas_http
+import cli
+import report
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+import mock_canvas  # noqa: E402
+import synthetic  # noqa: E402
+
+# Modo subcuenta de punta a punta contra el Canvas de prueba: todos los cursos del diplomado
+# comparten los primeros 31 caracteres del nombre y el reporte igual se genera
+def test_account_mode_with_shared_course_name_prefix(monkeypatch, tmp_path):
+    server = mock_canvas.start_server(synthetic.make_diplomado(3, 20, 2, account_id=7))
+    try:
+        monkeypatch.setattr(canvas_http, "BASE_URL", server.base_url)
+        course_ids, course_infos = report.account_courses(7)
+        outcome = cli.run_diplomado(None, course_ids, str(tmp_path), True, False, course_infos=course_infos)
+    finally:
+        server.shutdown()
+
+    assert course_ids == ["101", "102", "103"]
+    assert outcome['errors'] == []
+    assert openpyxl.load_workbook(outcome['path'], read_only=True).sheetnames == [
+        "Diplomado Sintético en Gestión ",
+        "Diplomado Sintético en Gest (2)",
+        "Diplomado Sintético en Gest (3)",
+        "Resumen Diplomado",
+    ]
@@ -0,0 +1,62 @@
+import pytest
+import requests
+
+import canvas
+
+URL = "https://canvas.test/api/v1/courses/101/assignments"
+NEXT = "https://canvas.test/api/v1/courses/101/assignments?page=2&per_page=2"
+
+def response(status, body=b"", headers=None):
+    r = requests.Response()
+    r.status_code = status
+    r._content = body
+    r.headers.update(headers or {})
+    return r
+
+# Canvas falso: responde en orden las respuestas indicadas y registra los headers de cada consulta
+class FakeCanvas:
+    def __init__(self, monkeypatch, tmp_path):
+        self.responses = []
+        self.requests = []
+        self.cache = canvas.CanvasCache(str(tmp_path / "cache.sqlite3"), "test")
+        monkeypatch.setattr(canvas, "CACHE", self.cache)
+        monkeypatch.setattr(canvas, "canvas_get", self.canvas_get)
+
+    def canvas_get(self, url, params=None, headers=None):
+        self.requests.append(headers)
+        return self.responses.pop(0)
+
+    def get(self, per_page):
+        # ttl=0: cada llamada revalida con If-None-Match
+        return canvas.canvas_get_json(URL, {"per_page": per_page}, lambda r: f"Error {r.status_code}", ttl=0)
+
+@pytest.fixture
+def fake(monkeypatch, tmp_path):
+    return FakeCanvas(monkeypatch, tmp_path)
+
+def test_not_modified_partial_page_is_served_from_cache(fake):
+    fake.responses = [response(200, b'[{"id": 1}]', {"ETag": '"a"'}), response(304)]
+    assert fake.get(2) == ([{"id": 1}], None)
+    assert fake.get(2) == ([{"id": 1}], None)
+    assert fake.requests[-1] == {"If-None-Match": '"a"'}
+
+def test_not_modified_uses_the_links_of_the_304(fake):
+    fake.responses = [
+        response(200, b'[{"id": 1}, {"id": 2}]', {"ETag": '"a"'}),
+        response(304, headers={"Link": f'<{NEXT}>; rel="next"'}),
+    ]
+    assert fake.get(2) == ([{"id": 1}, {"id": 2}], None)
+    assert fake.get(2) == ([{"id": 1}, {"id": 2}], NEXT)
+    assert len(fake.requests) == 2
+    assert fake.cache.get(URL + "?per_page=2")['next_url'] == NEXT
+
+def test_full_last_page_without_links_is_fetched_again(fake):
+    # Última página llena: después llegó una tarea nueva en una página 2 que el 304 no informa
+    fake.responses = [
+        response(200, b'[{"id": 1}, {"id": 2}]', {"ETag": '"a"'}),
+        response(304),
+        response(200, b'[{"id": 1}, {"id": 2}]', {"ETag": '"a"', "Link": f'<{NEXT}>; rel="next"'}),
+    ]
+    assert fake.get(2) == ([{"id": 1}, {"id": 2}], None)
+    assert fake.get(2) == ([{"id": 1}, {"id": 2}], NEXT)
+    assert fake.requests[-1] is None
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pandas as pd
+
+import canvas
+import canvas_http
+import report
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+import mock_canvas  # noqa: E402
+import synthetic  # noqa: E402
+
+# Con el mismo Canvas de prueba, REST y GraphQL deben dar exactamente la misma tabla. El servidor de
+# prueba, como Canvas, omite las tareas de otros periodos de calificación si la consulta no las pide
+def test_rest_and_graphql_give_the_same_course(monkeypatch):
+    server = mock_canvas.start_server(synthetic.make_diplomado(1, 150, 12))
+    try:
+        monkeypatch.setattr(canvas_http, "BASE_URL", server.base_url)
+        results = {}
+        for backend in ("rest", "graphql"):
+            monkeypatch.setattr(canvas, "CANVAS_BACKEND", backend)
+            results[backend] = report.process_course("101", True)
+    finally:
+        server.shutdown()
+
+    rest, graphql = results["rest"], results["graphql"]
+    assert len(rest['task_columns']) == 11
+    assert graphql['task_columns'] == rest['task_columns']
+    assert graphql['task_ids'] == rest['task_ids']
+    pd.testing.assert_frame_equal(graphql['df'], rest['df'])
@@ -0,0 +1,53 @@
+import openpyxl
+
+import report
+
+def enrollment(user_id, last_activity_at=None):
+    return {
+        "created_at": "2024-03-01T12:30:00Z",
+        "last_activity_at": last_activity_at,
+        "total_activity_time": 3600 if last_activity_at else 0,
+        "user": {"id": user_id, "sortable_name": f"Apellido{user_id}, Nombre", "sis_user_id": "123456789", "login_id": f"u{user_id}@x.cl"},
+    }
+
+def course_result(course_id, name):
+    df = report.build_students_df([enrollment(1, "2024-04-01T10:00:00Z"), enrollment(2)])
+    df["Tarea 1"] = [True, False]
+    return {
+        'df': df,
+        'task_columns': ["Tarea 1"],
+        'task_ids': {"Tarea 1": course_id * 10},
+        'course_info': {'id': course_id, 'name': name},
+        'sub_account_info': {'id': 1, 'name': "Diplomado"},
+    }
+
+def test_unique_sheet_name():
+    used = {report.SUMMARY_SHEET.lower()}
+    long_name = "Diplomado en Gestión de Proyectos Ágiles"
+    assert report.unique_sheet_name(long_name[:31], used) == long_name[:31]
+    assert report.unique_sheet_name(long_name[:31], used) == "Diplomado en Gestión de Pro (2)"
+    assert report.unique_sheet_name(long_name[:31].upper(), used) == "DIPLOMADO EN GESTIÓN DE PRO (3)"
+    assert report.unique_sheet_name("Resumen Diplomado", used) == "Resumen Diplomado (2)"
+    assert report.unique_sheet_name("resumen diplomado", used) == "resumen diplomado (3)"
+    assert report.unique_sheet_name("", used) == "Curso"
+    assert all(len(name) <= 31 for name in used)
+
+def test_export_with_clashing_course_names(tmp_path):
+    names = [
+        "Diplomado en Gestión de Proyectos Ágiles - Módulo 1",
+        "Diplomado en Gestión de Proyectos Ágiles - Módulo 2",
+        "DIPLOMADO EN GESTIÓN DE PROYECTOS ÁGILES - Módulo 3",
+        "Resumen Diplomado",
+    ]
+    results = {str(100 + i): course_result(100 + i, name) for i, name in enumerate(names)}
+    _, course_sheets, summary = report.build_report(results, include_assignments=True)
+    path = tmp_path / "reporte.xlsx"
+    report.export_report(str(path), course_sheets, summary, "Diplomado")
+
+    assert openpyxl.load_workbook(path, read_only=True).sheetnames == [
+        "Diplomado en Gestión de Proyect",
+        "Diplomado en Gestión de Pro (2)",
+        "DIPLOMADO EN GESTIÓN DE PRO (3)",
+        "Resumen Diplomado (2)",
+        "Resumen Diplomado",
+    ]
@@ -0,0 +1,123 @@
+import sqlite3
+
+import pytest
+
+import canvas
+
+HOUR = 3600
+
+# Reloj y Canvas falsos: cada llamada a get_course_submissions queda registrada con sus filtros
+# y responde lo que indique el test
+class FakeCanvas:
+    def __init__(self, monkeypatch, tmp_path):
+        self.now = 1_700_000_000.0
+        self.calls = []
+        self.full = []
+        self.changes = []
+        self.cache = canvas.CanvasCache(str(tmp_path / "cache.sqlite3"), "test")
+        monkeypatch.setattr(canvas, "CACHE", self.cache)
+        monkeypatch.setattr(canvas, "get_course_submissions", self.get_course_submissions)
+        monkeypatch.setattr(canvas.time, "time", lambda: self.now)
+
+    def get_course_submissions(self, course_id, submitted_since=None, graded_since=None, on_page=None):
+        self.calls.append({'submitted_since': submitted_since, 'graded_since': graded_since})
+        if submitted_since is None and graded_since is None:
+            return list(self.full)
+        return list(self.changes) if submitted_since else []
+
+    def full_fetches(self):
+        return sum(1 for c in self.calls if c['submitted_since'] is None and c['graded_since'] is None)
+
+def submission(assignment_id, user_id, state="submitted", grade=None):
+    return {'assignment_id': assignment_id, 'user_id': user_id, 'workflow_state': state, 'grade': grade}
+
+@pytest.fixture
+def fake(monkeypatch, tmp_path):
+    return FakeCanvas(monkeypatch, tmp_path)
+
+def test_first_run_downloads_everything(fake):
+    fake.full = [submission(1, 10), submission(1, 11, "unsubmitted"), submission(2, 10, "graded", "0")]
+
+    assert canvas.get_delivered_by_assignment(101) == {1: {10}}
+    snapshot = fake.cache.get_snapshot(101)
+    assert snapshot['synced_at'] == snapshot['full_synced_at'] == fake.now
+
+def test_changes_are_merged_into_the_snapshot(fake):
+    fake.full = [submission(1, 10), submission(1, 11), submission(2, 10)]
+    canvas.get_delivered_by_assignment(101)
+    full_synced_at = fake.now
+
+    fake.now += HOUR
+    # 12 entrega, 11 queda calificada con 0 (deja de contar) y aparece una tarea nueva
+    fake.changes = [submission(1, 12), submission(1, 11, "graded", "0"), submission(3, 10, "graded", "6.5")]
+    delivered = canvas.get_delivered_by_assignment(101)
+
+    assert delivered == {1: {10, 12}, 2: {10}, 3: {10}}
+    assert fake.full_fetches() == 1
+    assert fake.calls[-2]['submitted_since'] == "2023-11-14T22:08:20Z"
+    snapshot = fake.cache.get_snapshot(101)
+    assert snapshot['delivered'] == delivered
+    assert snapshot['synced_at'] == fake.now
+    assert snapshot['full_synced_at'] == full_synced_at
+
+def test_frequent_runs_still_rebuild_after_max_age(fake):
+    fake.full = [submission(1, 10), submission(1, 11)]
+    canvas.get_delivered_by_assignment(101)
+
+    # Reportes cada hora: la foto se actualiza siempre, pero la descarga completa tiene que volver
+    # apenas pasen SNAPSHOT_MAX_AGE desde la anterior
+    runs = canvas.SNAPSHOT_MAX_AGE // HOUR
+    for _ in range(runs):
+        fake.now += HOUR
+        canvas.get_delivered_by_assignment(101)
+    assert fake.full_fetches() == 1
+
+    # La entrega de 11 se eliminó en Canvas: no aparece como cambio, solo en la descarga completa
+    fake.full = [submission(1, 10)]
+    fake.now += HOUR
+    assert canvas.get_delivered_by_assignment(101) == {1: {10}}
+    assert fake.full_fetches() == 2
+    assert fake.cache.get_snapshot(101)['full_synced_at'] == fake.now
+
+def test_snapshots_from_older_caches_are_rebuilt(fake, monkeypatch, tmp_path):
+    path = tmp_path / "old.sqlite3"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE submission_snapshots (scope TEXT, course_id TEXT, delivered TEXT, synced_at REAL, "
+        "PRIMARY KEY (scope, course_id))"
+    )
+    conn.execute("INSERT INTO submission_snapshots VALUES ('test', '101', '{\"1\": [10, 11]}', ?)", (fake.now,))
+    conn.commit()
+    conn.close()
+
+    cache = canvas.CanvasCache(str(path), "test")
+    assert cache.get_snapshot(101)['full_synced_at'] is None
+    monkeypatch.setattr(canvas, "CACHE", cache)
+    fake.full = [submission(1, 10)]
+    assert canvas.get_delivered_by_assignment(101) == {1: {10}}
+    assert fake.full_fetches() == 1
+
+def test_graphql_bundle_uses_the_snapshot(fake, monkeypatch):
+    requested = []
+
+    def get_course_bundle(course_id, on_page=None, with_submissions=True):
+        requested.append(with_submissions)
+        submissions = [submission(1, 10), submission(1, 11)] if with_submissions else []
+        return {'course': {'id': course_id}, 'students': [], 'assignments': [], 'submissions': submissions}
+    monkeypatch.setattr(canvas.canvas_graphql, "get_course_bundle", get_course_bundle)
+
+    # Sin foto: las entregas vienen en la consulta y quedan como foto completa
+    assert canvas.get_course_bundle(101)['delivered'] == {1: {10, 11}}
+    assert fake.cache.get_snapshot(101)['full_synced_at'] == fake.now
+
+    # Con foto vigente: la consulta no pide entregas y solo se bajan los cambios
+    fake.now += HOUR
+    fake.changes = [submission(2, 11)]
+    assert canvas.get_course_bundle(101)['delivered'] == {1: {10, 11}, 2: {11}}
+    assert requested == [True, False]
+    assert fake.full_fetches() == 0
+
+    # Vencida la foto, vuelve a pedir todas las entregas en la consulta
+    fake.now += canvas.SNAPSHOT_MAX_AGE
+    canvas.get_course_bundle(101)
+    assert requested == [True, False, True]